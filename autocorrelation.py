@@ -0,0 +1,139 @@
+# Autocorrelation of lattice data along the Monte Carlo history. All
+# correlators and timeslices are analysed at once with one FFT along the axis
+# of gauge configurations.
+
+import numpy as np
+import pandas as pd
+from pandas import Series, DataFrame
+
+import utils
+
+def autocorrelation(data):
+  """
+  Normalized autocorrelation function along the gauge configurations
+
+  Parameters
+  ----------
+  data : np.array
+      Real array with shape (rows, cnfg, T). The configurations must be
+      ordered by their position in the Monte Carlo history
+
+  Returns
+  -------
+  np.array
+      rho(t) with shape (rows, cnfg, T) where t is the distance in units of
+      the configuration stepping. rho(0) = 1
+
+  Notes
+  -----
+  The data is padded with zeros to twice its length to get the linear instead
+  of the circular correlation
+  """
+
+  nb_cnfg = data.shape[1]
+  X = data - data.mean(axis=1, keepdims=True)
+
+  f = np.fft.rfft(X, n=2*nb_cnfg, axis=1)
+  gamma = np.fft.irfft(f*np.conj(f), axis=1)[:,:nb_cnfg]
+  # number of pairs entering every distance
+  gamma /= (nb_cnfg - np.arange(nb_cnfg))[np.newaxis,:,np.newaxis]
+
+  with np.errstate(divide='ignore', invalid='ignore'):
+    return gamma / gamma[:,:1]
+
+def integrated_time(rho, c=5.):
+  """
+  Integrated autocorrelation time with automatic windowing
+
+  Parameters
+  ----------
+  rho : np.array
+      Normalized autocorrelation function with shape (rows, cnfg, T) as
+      returned by autocorrelation()
+  c : float, optional
+      The window W is the smallest distance with W >= c*tau_int(W) (Madras and
+      Sokal)
+
+  Returns
+  -------
+  tau : np.array
+      Integrated autocorrelation time with shape (rows, T)
+  dtau : np.array
+      Its statistical error
+  W : np.array
+      The summation window
+  """
+
+  nb_cnfg = rho.shape[1]
+
+  # tau_int(W) = 1/2 + \sum_{t=1}^W rho(t) for all windows at once
+  tau = 0.5 + np.cumsum(rho[:,1:], axis=1)
+  W = np.arange(1, nb_cnfg)[np.newaxis,:,np.newaxis]
+
+  window = W >= c*tau
+  # if no window fulfills the criterion the largest one is taken
+  pos = np.where(window.any(axis=1), np.argmax(window, axis=1), nb_cnfg-2)
+
+  tau = tau[np.arange(tau.shape[0])[:,np.newaxis], pos,
+                                          np.arange(tau.shape[2])[np.newaxis]]
+  W = pos + 1
+
+  dtau = tau * np.sqrt(2.*(2*W+1) / nb_cnfg)
+
+  return tau, dtau, W
+
+def block_size(tau):
+  """
+  Suggested number of consecutive configurations to resample together
+
+  Parameters
+  ----------
+  tau : np.array
+      Integrated autocorrelation times
+
+  Returns
+  -------
+  int
+      2*tau_int rounded up for the largest tau_int. Blocks of that size are
+      approximately independent
+  """
+
+  tau = np.asarray(tau)
+  tau = tau[np.isfinite(tau)]
+  if len(tau) == 0:
+    return 1
+  return max(1, int(np.ceil(2*tau.max())))
+
+def analyse(data, verbose=False):
+  """
+  Integrated autocorrelation times of all rows and timeslices of a table
+
+  Parameters
+  ----------
+  data : pd.DataFrame
+      Table with purely real entries, arbitrary rows and hierarchical columns
+      for gauge configuration number and timeslice
+
+  Returns
+  -------
+  pd.DataFrame
+      Table with the rows of `data` and columns {'tau_int', 'dtau_int', 'W'} x
+      T
+
+  Notes
+  -----
+  tau_int is given in units of the configuration stepping
+  """
+
+  data = data.sort_index(axis=1)
+  T = np.asarray(data.columns.get_level_values(1).unique())
+
+  if verbose:
+    print '\tcalculating autocorrelation of %d correlators' % len(data.index)
+
+  tau, dtau, W = integrated_time(autocorrelation(
+                                       utils.pd_dataframe_to_np_array(data)))
+
+  columns = pd.MultiIndex.from_product([['tau_int', 'dtau_int', 'W'], T])
+  return DataFrame(np.concatenate([tau, dtau, W], axis=1), index=data.index,
+                                                                columns=columns)
@@ -0,0 +1,72 @@
+#!/usr/bin/python
+# Start up time of the analysis. Every scenario imports what a run with the
+# given stages needs in a fresh interpreter and reports the wall time and
+# which of the heavy dependencies were loaded.
+#
+# Run from anywhere: python benchmarks/startup.py [-n REPEAT]
+
+import argparse
+import os
+import subprocess
+import sys
+
+root = os.path.normpath(os.path.join(os.path.dirname(
+                                            os.path.abspath(__file__)), '..'))
+
+# dependencies only some of the stages need
+lookup_heavy = ['matplotlib', 'gmpy', 'asteval', 'clebsch_gordan', 'scipy']
+
+# statements importing what a run needs. analyse is loaded as module without
+# running main(). Some versions of pandas import matplotlib themselves, the
+# baseline shows what is loaded before any module of the analysis
+lookup_scenarios = [
+  ('baseline', "import numpy, pandas"),
+  ('analyse', "import imp; imp.load_source('analyse', 'analyse')"),
+  ('read', "import infile_handler, raw_data, pipeline; pipeline.read"),
+  ('gevp export', "import infile_handler, pipeline, setup_gevp, utils; "\
+                  "pipeline.build_gevp"),
+  ('subduction', "import pipeline, subduction; subduction.aeval('1')"),
+  ('plot', "import pipeline, plot"),
+]
+
+measure = """
+import sys, time
+t = time.time()
+%s
+t = time.time() - t
+heavy = [m for m in %r if m in sys.modules]
+print('%%f %%s' %% (t, ','.join(heavy)))
+"""
+
+def run(statement):
+  """
+  Import time in seconds and the heavy modules loaded by `statement` in a new
+  interpreter
+  """
+
+  out = subprocess.check_output([sys.executable, '-c',
+                      measure % (statement, lookup_heavy)], cwd=root).split()
+  return float(out[0]), out[1] if len(out) > 1 else '-'
+
+def main():
+
+  parser = argparse.ArgumentParser()
+  parser.add_argument("-n", "--repeat", type=int, default=5,
+                        help="number of fresh interpreters per scenario")
+  args = parser.parse_args()
+
+  print '%-12s %10s %10s  %s' % ('scenario', 'min [s]', 'mean [s]', 'loaded')
+  for name, statement in lookup_scenarios:
+    try:
+      results = [run(statement) for _ in range(args.repeat)]
+    except subprocess.CalledProcessError:
+      print '%-12s %10s' % (name, 'failed')
+      continue
+    times = [t for t, _ in results]
+    print '%-12s %10.3f %10.3f  %s' % (name, min(times),
+                                   sum(times)/len(times), results[-1][1])
+
+
+################################################################################
+if __name__ == '__main__':
+  main()
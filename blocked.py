@@ -0,0 +1,122 @@
+# Out-of-core processing of long ensembles. Reading, subduction and contraction
+# never mix configurations, so they are run on blocks of contiguous
+# configurations one after the other. Every block is appended to the files of
+# the full ensemble and only the averaged data of all blocks is kept and
+# concatenated, the memory needed for the rest depends on the size of the
+# blocks instead of the length of the ensemble.
+
+import numpy as np
+import pandas as pd
+
+import raw_data
+import pipeline
+import shard
+from ensemble import Ensemble
+
+def set_nb_blocks(params):
+  """
+  Number of blocks with at most params['cnfg_block'] configurations each
+  """
+
+  nb_cnfg = len(raw_data.set_lookup_cnfg(params['sta_cnfg'],
+        params['end_cnfg'], params['del_cnfg'], params['missing_configs'], 0,
+        params['nb_preview'], params['preview_selection']))
+  return max(1, int(np.ceil(nb_cnfg / float(params['cnfg_block']))))
+
+def run_block(params, p_cm, index, nb_blocks):
+  """
+  Read, subduce, contract and average one block and append it to the 
+  checkpoints of the full ensemble
+
+  Parameters
+  ----------
+  params : dict
+      Parameters of the full ensemble as returned by 
+      infile_handler.read_parameters()
+  p_cm : int
+      Center of mass momentum
+  index : int
+      Index of the block
+  nb_blocks : int
+      Number of blocks, see set_nb_blocks()
+
+  Returns
+  -------
+  dict
+      Averaged data of the block keyed by (correlator, irrep)
+  """
+
+  # the block is sliced from the configurations like a shard
+  ensemble = Ensemble(shard.shard_params(params, index, nb_blocks), 
+                                                      reuse=False, write=False)
+  outputs = shard.outputs(ensemble, p_cm)
+  stages = shard.lookup_shard_stages
+
+  contracted_data_avg = {}
+  for stage in stages:
+    for output in [o for o in outputs if o[0] == stage]:
+      data = getattr(ensemble, stage)(*output[1:])
+      if stage == 'averaged':
+        contracted_data_avg[output[2:]] = data
+        continue
+
+      directory, filename = ensemble.artifact(*output)
+      if stage == 'raw':
+        data, lookup_qn = data
+        if index == 0:
+          pipeline.write(params, 'raw', filename.replace('.h5', '_qn.h5'),
+                                               lookup_qn, 'qn', verbose=False)
+      # raw data has configurations as rows, all later stages as columns
+      pipeline.append(params, directory, filename, data, index,
+                                                    0 if stage == 'raw' else 1)
+
+    # the stage before is not needed anymore
+    if stage != stages[0]:
+      ensemble.clear(stages[stages.index(stage)-1])
+
+  return contracted_data_avg
+
+def run(params, p_cm):
+  """
+  Averaged data of all correlators in the frame `p_cm` computed block by block
+
+  Parameters
+  ----------
+  params : dict
+      Parameters as returned by infile_handler.read_parameters() with
+      params['cnfg_block'] configurations per block
+
+  Returns
+  -------
+  dict
+      Averaged data of the full ensemble keyed by (correlator, irrep). It is
+      written to disk if contracted data is a checkpoint
+
+  Notes
+  -----
+  Every block is appended to the files of the stages chosen as checkpoints as
+  a dataset of its own, see pipeline.append(). Reading such a file 
+  concatenates the blocks. The files get the digest of the full ensemble once
+  all blocks are written, see Ensemble.is_current()
+  """
+
+  nb_blocks = set_nb_blocks(params)
+  ensemble = Ensemble(params)
+
+  blocks = []
+  for index in range(nb_blocks):
+    print '\tprocessing block %d of %d' % (index+1, nb_blocks)
+    blocks.append(run_block(params, p_cm, index, nb_blocks))
+
+  # averaging never mixes configurations either
+  contracted_data_avg = {}
+  for key in blocks[0]:
+    contracted_data_avg[key] = pd.concat([b[key] for b in blocks], axis=1)
+    pipeline.write_contracted(params, key[0], p_cm, key[1],
+                                          contracted_data_avg[key], avg=True)
+  del blocks
+
+  for output in shard.outputs(ensemble, p_cm):
+    ensemble.write_digest(*output)
+
+  return contracted_data_avg
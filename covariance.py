@@ -0,0 +1,154 @@
+# Covariance matrices between timeslices for many correlation functions at
+# once. The estimates can be shrunk towards their diagonal following Ledoit and
+# Wolf to stabilize correlated fits with few gauge configurations.
+
+import os
+
+import numpy as np
+import pandas as pd
+from pandas import Series, DataFrame
+
+import utils
+
+def covariance(data, shrinkage=False):
+  """
+  Covariance matrix of the mean over gauge configurations for every row
+
+  Parameters
+  ----------
+  data : np.array
+      Real array with shape (rows, cnfg, T)
+  shrinkage : bool, optional
+      Shrink the sample covariance towards its diagonal with the optimal
+      intensity given by Ledoit and Wolf
+
+  Returns
+  -------
+  cov : np.array
+      Covariance matrices of the mean with shape (rows, T, T)
+  intensity : np.array
+      The shrinkage intensity for every row. 0 if `shrinkage` is False
+
+  Notes
+  -----
+  The intensity is estimated as in Schaefer and Strimmer, Stat. Appl. Genet.
+  Mol. Biol. 4 (2005) 32:
+  \lambda = \sum_{i \neq j} Var(S_{ij}) / \sum_{i \neq j} S_{ij}^2
+  """
+
+  nb_cnfg = data.shape[1]
+  X = data - data.mean(axis=1, keepdims=True)
+
+  # sample covariance with shape (rows, T, T)
+  w_mean = np.einsum('rki,rkj->rij', X, X) / nb_cnfg
+  S = w_mean * nb_cnfg / (nb_cnfg-1.)
+
+  intensity = np.zeros(len(data))
+  if shrinkage:
+    X2 = X**2
+    var = (np.einsum('rki,rkj->rij', X2, X2) - nb_cnfg*w_mean**2) * \
+                                                  nb_cnfg / (nb_cnfg-1.)**3
+    off_diagonal = 1. - np.eye(data.shape[2])
+    with np.errstate(divide='ignore', invalid='ignore'):
+      intensity = np.sum(var*off_diagonal, axis=(1,2)) / \
+                                        np.sum(S**2*off_diagonal, axis=(1,2))
+    intensity = np.clip(np.nan_to_num(intensity), 0., 1.)
+
+    diagonal = S * np.eye(data.shape[2])
+    l = intensity[:,np.newaxis,np.newaxis]
+    S = l*diagonal + (1.-l)*S
+
+  return S / nb_cnfg, intensity
+
+def from_samples(samples, method):
+  """
+  Covariance matrix from resampled values for every row
+
+  Parameters
+  ----------
+  samples : np.array
+      Array with shape (samples, rows, T) where sample 0 is the mean value
+  method : string, {'bootstrap', 'jackknife'}
+      The method `samples` were created with
+
+  Returns
+  -------
+  np.array
+      Covariance matrices with shape (rows, T, T)
+  """
+
+  samples = samples[1:]
+  n = samples.shape[0]
+  X = samples - samples.mean(axis=0)
+
+  cov = np.einsum('kri,krj->rij', X, X)
+  if method == 'jackknife':
+    return cov * (n-1.)/n
+  return cov / (n-1.)
+
+def write_covariance(path, filename, data, shrinkage=False, verbose=False):
+  """
+  Calculate the covariance matrices of all rows of a table and write them
+  into a compressed numpy file
+
+  Parameters
+  ----------
+  path : string
+      Path to store the file
+  filename : string
+      Name to save the file as. Numpy appends '.npz' if missing
+  data : pd.DataFrame or dict
+      Table with purely real entries, arbitrary rows and hierarchical columns
+      for gauge configuration number and timeslice. Or tables of that kind 
+      keyed by (correlator, irrep), e.g. a stage of store.ArtifactStore. They
+      are read one after the other and their rows prefixed by the key
+  shrinkage : bool, optional
+      Whether to apply the Ledoit-Wolf shrinkage
+
+  Notes
+  -----
+  The file contains the arrays 'cov' with shape (rows, T, T), 'intensity',
+  'T' and 'index' with the string representation of the row labels and
+  'index_names'. Rows and configurations without data are dropped from every
+  table of a dict
+  """
+
+  if isinstance(data, pd.DataFrame):
+    tables = [((), data)]
+    names = []
+  else:
+    tables = ((key, data[key]) for key in sorted(data.keys()))
+    names = ['correlator', 'irrep']
+
+  cov, intensity, index = [], [], []
+  for key, table in tables:
+    if key != ():
+      table = table.dropna(axis=0,how='all').dropna(axis=1,how='all')
+      if table.empty:
+        continue
+    table = table.sort_index(axis=1)
+    T_table = np.asarray(table.columns.get_level_values(1).unique())
+    if len(index) == 0:
+      T = T_table
+      index_names = names + list(table.index.names)
+    elif not np.array_equal(T, T_table):
+      raise ValueError('in write_covariance: timeslices of %s differ' % \
+                                                                     str(key))
+
+    cov_table, intensity_table = covariance(
+                          utils.pd_dataframe_to_np_array(table), shrinkage)
+    cov.append(cov_table)
+    intensity.append(intensity_table)
+    index += [str(key + (row if isinstance(row, tuple) else (row,))) \
+                        if key else str(row) for row in table.index.values]
+
+  if len(index) == 0:
+    raise ValueError('in write_covariance: no data')
+
+  utils.ensure_dir(path)
+  np.savez_compressed(os.path.join(path, filename), cov=np.concatenate(cov),
+      intensity=np.concatenate(intensity), T=T, index=np.array(index),
+      index_names=np.array([str(n) for n in index_names]))
+
+  if verbose:
+    print '\tfinished writing', filename
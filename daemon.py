@@ -0,0 +1,209 @@
+# A long running local server keeping the imported modules, the tables shared
+# between ensembles and recently used data in memory. A job is sent as one line
+# of json over a Unix socket and everything the job prints is streamed back.
+#
+# The client only needs the standard library. The modules of the analysis are
+# imported when the server is started.
+
+import collections
+import json
+import os
+import socket
+import SocketServer
+import sys
+import traceback
+
+default_socket = os.path.join(os.path.expanduser('~'), '.analysed.sock')
+
+# stages a job may select and the flags switching them on
+lookup_stage_flags = {'read' : 'flag_read', 'subduce' : 'flag_subduction',
+                      'contract' : 'flag_contraction', 'gevp' : 'flag_gevp',
+                      'solve' : 'flag_solve', 'plot' : 'flag_plot'}
+
+# last line sent for every job followed by done or failed
+status_marker = '#analysed#'
+
+class _Stream(object):
+  """
+  File-like object sending everything written to the client. Output is
+  dropped when the client disconnected
+  """
+
+  def __init__(self, wfile):
+    self.wfile = wfile
+    self.closed = False
+
+  def write(self, s):
+    if self.closed:
+      return
+    try:
+      self.wfile.write(s)
+      self.wfile.flush()
+    except socket.error:
+      self.closed = True
+
+  def flush(self):
+    pass
+
+class _Handler(SocketServer.StreamRequestHandler):
+
+  def handle(self):
+    stream = _Stream(self.wfile)
+    stdout = sys.stdout
+    sys.stdout = stream
+    try:
+      self.server.run_job(json.loads(self.rfile.readline()))
+      status = 'done'
+    except Exception:
+      traceback.print_exc(file=stream)
+      status = 'failed'
+    finally:
+      sys.stdout = stdout
+    stream.write('%s %s\n' % (status_marker, status))
+
+class Server(SocketServer.UnixStreamServer):
+  """
+  Server running one job after the other
+
+  Parameters
+  ----------
+  path : string
+      Path of the Unix socket
+  max_ensembles : int, optional
+      Number of ensembles whose data is kept in memory between jobs. The least
+      recently used one is dropped first
+  """
+
+  def __init__(self, path=default_socket, max_ensembles=2):
+    if os.path.exists(path):
+      if _is_alive(path):
+        raise IOError('a server is already listening on %s' % path)
+      os.remove(path)
+
+    SocketServer.UnixStreamServer.__init__(self, path, _Handler)
+    self.ensembles = collections.OrderedDict()
+    self.max_ensembles = max_ensembles
+
+  def server_close(self):
+    SocketServer.UnixStreamServer.server_close(self)
+    if os.path.exists(self.server_address):
+      os.remove(self.server_address)
+
+  def run_job(self, job):
+    """
+    Run the task graph of one infile with the cache switched on
+
+    Parameters
+    ----------
+    job : dict
+        'infile' : absolute path of the infile,
+        'stages' : optional list of keys of lookup_stage_flags to run instead
+                   of the stages switched on in the infile,
+        'p_cm' : optional list of center of mass momenta to restrict the job
+                 to, 'basis' and 'verbose' as the command line options of
+                 analyse
+    """
+
+    import infile_handler
+    import scheduler
+    from ensemble import Ensemble
+
+    params = infile_handler.read_infile(job['infile'],
+               job.get('basis', 'cyclic-christian'), job.get('verbose', False))
+    params['streaming'] = False
+    params['cache'] = True
+    # the client sees which tasks are run and skipped
+    params['verbose'] = True
+    if job.get('stages'):
+      for stage, flag in lookup_stage_flags.items():
+        params[flag] = stage in job['stages']
+    if job.get('p_cm'):
+      params['p_cm'] = job['p_cm']
+
+    # keep the data of the infile in memory. Whatever depends on changed
+    # parameters is recomputed, see Ensemble.update()
+    ensemble = self.ensembles.pop(job['infile'], None)
+    if ensemble is None:
+      ensemble = Ensemble(params)
+    else:
+      ensemble.update(params)
+    self.ensembles[job['infile']] = ensemble
+    while len(self.ensembles) > self.max_ensembles:
+      self.ensembles.popitem(last=False)
+
+    scheduler.run(params, ensemble=ensemble)
+
+def _is_alive(path):
+  """
+  Whether a server accepts connections on the socket `path`
+  """
+
+  sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  try:
+    sock.connect(path)
+  except socket.error:
+    return False
+  finally:
+    sock.close()
+  return True
+
+def serve(path=default_socket, infiles=(), max_ensembles=2):
+  """
+  Start the server and run jobs until interrupted
+
+  Parameters
+  ----------
+  path : string, optional
+      Path of the Unix socket
+  infiles : list of string, optional
+      The tables shared between ensembles are calculated for the frames and
+      diagrams of these infiles before the first job
+  max_ensembles : int, optional
+      See Server
+  """
+
+  # importing everything now keeps it out of the time of the first job
+  import infile_handler
+  import pipeline
+  import scheduler
+
+  for infile in infiles:
+    print 'preparing tables for %s' % infile
+    pipeline.precompute_tables(infile_handler.read_infile(infile))
+
+  server = Server(path, max_ensembles)
+  print 'listening on %s' % path
+  try:
+    server.serve_forever()
+  finally:
+    server.server_close()
+
+def submit(infile, stages=None, p_cm=None, basis='cyclic-christian',
+                               verbose=False, path=default_socket, out=sys.stdout):
+  """
+  Send a job to the server and copy its output to `out` while it runs
+
+  Returns
+  -------
+  bool
+      Whether the job succeeded
+  """
+
+  job = {'infile' : os.path.abspath(infile), 'stages' : stages, 'p_cm' : p_cm,
+                                          'basis' : basis, 'verbose' : verbose}
+
+  sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  sock.connect(path)
+  try:
+    sock.sendall(json.dumps(job) + '\n')
+    status = None
+    for line in sock.makefile('r'):
+      if line.startswith(status_marker):
+        status = line.split()[-1]
+        break
+      out.write(line)
+      out.flush()
+  finally:
+    sock.close()
+
+  return status == 'done'
@@ -0,0 +1,469 @@
+# Object oriented access to all stages of the analysis of one ensemble. Data is
+# only computed when it is asked for and kept in memory afterwards. If the
+# output of a stage already exists on disk and was computed from the same 
+# inputs it is read instead of recomputed, so asking for the gevp of one irrep 
+# only reads and subduces what that irrep needs.
+
+import hashlib
+import os
+
+import raw_data
+import selection
+import wick
+import pipeline
+import infile_handler
+from store import ArtifactStore
+
+# infile flag switching the computation of every stage on
+lookup_flag = {'raw' : 'flag_read', 'subduced' : 'flag_subduction',
+               'contracted' : 'flag_contraction', 
+               'averaged' : 'flag_contraction', 'gevp' : 'flag_gevp',
+               'plot' : 'flag_plot'}
+
+class Ensemble(object):
+  """
+  Lazily computed and memoized data of one ensemble
+
+  Parameters
+  ----------
+  params : dict
+      Parameters as returned by infile_handler.read_parameters()
+  reuse : bool, optional
+      Load the output of a stage from disk if it exists. Otherwise everything
+      is computed from the raw data of the contraction code
+  write : bool, optional
+      Write every computed stage to disk. The checkpoints of the streaming mode
+      are respected
+  recompute : iterable of string, optional
+      Stages out of {'raw', 'subduced', 'contracted', 'averaged'} that are 
+      never loaded from disk
+  store : ArtifactStore, optional
+      Store of the memoized data. Defaults to one with the memory budget and
+      scratch directory of `params`
+
+  Notes
+  -----
+  Next to every output file a digest of its inputs is stored: the parameters 
+  of the infile it depends on, the list of configurations, the continuum basis 
+  and the digests of the stages it is computed from. A file is only loaded if 
+  its digest matches the current inputs. Files without digest were written
+  without the cache or by an older version. They are recomputed if the cache 
+  is switched on and their stage is computed by the infile, otherwise they 
+  are loaded as they are.
+
+  All accessors take the center of mass momentum first, followed by the
+  diagram or correlator and the irrep. The lattice T of folded data is the
+  lattice T as well, see raw_data.fold_data()
+  """
+
+  def __init__(self, params, reuse=True, write=True, recompute=(),
+                                                                   store=None):
+    self.params = params
+    self.reuse = reuse
+    self.write = write
+    self.recompute = set(recompute)
+    if store is None:
+      store = ArtifactStore(params['memory_budget'], params['scratch'])
+    self._cache = store
+
+  @classmethod
+  def from_infile(cls, infile, basis='cyclic-christian', verbose=False,
+                                                                     **kwargs):
+    """
+    Ensemble described by the infile `infile`
+
+    Parameters
+    ----------
+    infile : string
+        Name of the infile
+    basis : string, optional
+        Continuum basis as given by the -b option of the analyse script
+    verbose : bool, optional
+        Verbosity as given by the -v option of the analyse script
+    """
+
+    return cls(infile_handler.read_infile(infile, basis, verbose), **kwargs)
+
+  def view(self, **kwargs):
+    """
+    Ensemble with the same parameters and memoized data but different 
+    options. Takes the keyword arguments `reuse`, `write` and `recompute` of
+    Ensemble()
+    """
+
+    options = dict(reuse=self.reuse, write=self.write, 
+                                                    recompute=self.recompute)
+    options.update(kwargs)
+    return type(self)(self.params, store=self._cache, **options)
+
+  ##############################################################################
+  # artifacts on disk
+
+  def artifact(self, stage, p_cm, *names):
+    """
+    Stage directory and filename of the output of `stage`
+
+    Parameters
+    ----------
+    stage : string {'raw', 'subduced', 'contracted', 'averaged', 'gevp', 'plot'}
+        The stage
+    p_cm : int
+        Center of mass momentum
+    names : strings
+        The diagram or correlator and the irrep as far as they apply
+
+    Notes
+    -----
+    The gevp and the plots consist of several files. For them only the name of
+    the file with the digest is given
+    """
+
+    if stage == 'raw':
+      return 'raw', '%s_p%1i.h5' % (names[0], p_cm)
+    if stage in ['subduced', 'contracted']:
+      return stage, '%s_p%1i_%s.h5' % (names[0], p_cm, names[1])
+    if stage == 'averaged':
+      return 'contracted', '%s_p%1i_%s_avg.h5' % (names[0], p_cm, names[1])
+    if stage == 'gevp':
+      return 'gevp', 'Gevp_p%1i_%s' % (p_cm, names[0])
+    if stage == 'plot':
+      return 'plot', 'p%1i/%s/plots' % (p_cm, names[0])
+    raise ValueError('in Ensemble.artifact: stage %s unknown' % stage)
+
+  def _inputs(self, stage, p_cm, *names):
+    """
+    Everything the output of `stage` depends on. Upstream stages enter by their
+    digest
+    """
+
+    params = self.params
+
+    if stage == 'raw':
+      diagram, = names
+      lookup_cnfg = raw_data.set_lookup_cnfg(params['sta_cnfg'],
+          params['end_cnfg'], params['del_cnfg'], params['missing_configs'], 0,
+          params['nb_preview'], params['preview_selection'], 
+                                                         shard=params['shard'])
+      return (stage, p_cm, diagram, self.directory(diagram), list(lookup_cnfg),
+              params['p_max'], params['gammas'], params['flag_ana'],
+                            params['flag_old'], params['T'], params['fold'])
+
+    if stage == 'subduced':
+      diagram, irrep = names
+      return (stage, self.digest('raw', p_cm, diagram), irrep,
+                                                     params['continuum_basis'])
+
+    if stage == 'contracted':
+      correlator, irrep = names
+      return (stage, [self.digest('subduced', p_cm, d, irrep) \
+                            for d in self.contributing_diagrams(correlator)],
+                                         correlator, irrep, params['flag_ana'])
+
+    if stage == 'averaged':
+      return (stage, self.digest('contracted', p_cm, *names))
+
+    if stage == 'gevp':
+      irrep, = names
+      return (stage, [self.digest('averaged', p_cm, c, irrep) \
+                                                for c in self.gevp_correlators],
+              params['flag_solve'], params['t0s'], params['resampling'],
+                               params['bootstrapsize'], self.block_size(p_cm))
+
+    if stage == 'plot':
+      irrep, = names
+      return (stage, [self.digest('contracted', p_cm, c, irrep) \
+                                                    for c in self.correlators],
+              [self.digest('averaged', p_cm, c, irrep) \
+                                                    for c in self.correlators],
+              [params[key] for key in ['sep_rows_sep_mom', 'sep_rows_sum_mom',
+                'avg_rows_sep_mom', 'avg_rows_sum_mom', 'logscale',
+                'bootstrapsize', 'plot_resampling', 'quick_look',
+                                           'continuum_basis', 'flag_gevp']],
+              self.block_size(p_cm))
+
+    raise ValueError('in Ensemble.digest: stage %s unknown' % stage)
+
+  def digest(self, stage, p_cm, *names):
+    """
+    Hash of all inputs of the output of `stage`. See artifact() for the
+    parameters
+    """
+
+    key = ('digest', stage, p_cm) + names
+    if key not in self._cache:
+      self._cache[key] = hashlib.sha1(
+                          repr(self._inputs(stage, p_cm, *names))).hexdigest()
+    return self._cache[key]
+
+  def is_current(self, stage, p_cm, *names):
+    """
+    Whether the output of `stage` exists on disk and was computed from the
+    current inputs. An output without digest is current unless the cache and
+    the flag of `stage` are switched on
+    """
+
+    if not self.reuse or stage in self.recompute:
+      return False
+    return self._on_disk(stage, p_cm, *names)
+
+  def _on_disk(self, stage, p_cm, *names):
+    """
+    Whether the output of `stage` on disk is current. See is_current()
+    """
+
+    directory, filename = self.artifact(stage, p_cm, *names)
+    path = pipeline.set_path(self.params, directory) + filename
+    if stage not in ['gevp', 'plot'] and not os.path.isfile(path):
+      return False
+
+    digest = pipeline.read_digest(self.params, directory, filename)
+    if digest is None:
+      # the gevp and plots without digest cannot be checked for existence
+      return stage not in ['gevp', 'plot'] and \
+           not (self.params['cache'] and self.params[lookup_flag[stage]])
+    return digest == self.digest(stage, p_cm, *names)
+
+  def write_digest(self, stage, p_cm, *names):
+    """
+    Record the digest of the output of `stage` next to it
+    """
+
+    directory, filename = self.artifact(stage, p_cm, *names)
+    pipeline.write_digest(self.params, directory, filename,
+                                              self.digest(stage, p_cm, *names))
+
+  def _cached(self, key, digest, compute):
+    """
+    Memoized result of `compute` as long as `digest` stays the same
+    """
+
+    if key not in self._cache or self._cache[key][0] != digest:
+      self._cache[key] = (digest, compute())
+    return self._cache[key][1]
+
+  def _missing(self, stage, p_cm, *names):
+    """
+    Whether the memoized output of `stage` has to be written because its file
+    was removed or the output path changed
+    """
+
+    return self.write and pipeline.is_checkpoint(self.params, 
+                             self.artifact(stage, p_cm, *names)[0]) and \
+                                          not self._on_disk(stage, p_cm, *names)
+
+  def _memoize(self, stage, p_cm, names, load, compute, store):
+    """
+    Return the cached output of `stage`, load it from disk or compute and
+    store it. Cached data is written again if its file is not current
+    """
+
+    key = (stage, p_cm) + names
+    digest = self.digest(stage, p_cm, *names)
+    if key in self._cache and self._cache[key][0] == digest:
+      value = self._cache[key][1]
+      if self._missing(stage, p_cm, *names):
+        store(value)
+        self.write_digest(stage, p_cm, *names)
+      return value
+
+    def load_or_compute():
+      if self.is_current(stage, p_cm, *names):
+        if self.params['verbose']:
+          print '\tloading %s %s' % (stage, ' '.join(map(str, (p_cm,)+names)))
+        return load()
+
+      if self.params['verbose']:
+        print '\tcomputing %s %s' % (stage, ' '.join(map(str, (p_cm,)+names)))
+      value = compute()
+      if self.write:
+        store(value)
+        self.write_digest(stage, p_cm, *names)
+      return value
+
+    return self._cached(key, digest, load_or_compute)
+
+  def update(self, params):
+    """
+    Continue with changed parameters. Memoized data stays valid as long as its
+    digest and the output path do not change
+    """
+
+    outpath = self.params['outpath']
+    self.params = params
+    self.clear('digest')
+    if params['outpath'] != outpath:
+      self.clear()
+
+  def clear(self, stage=None):
+    """
+    Drop memoized data of `stage` or of all stages from memory
+    """
+
+    for key in self._cache.keys():
+      if (stage is None and key[0] != 'digest') or key[0] == stage:
+        del self._cache[key]
+
+  def directory(self, diagram):
+    """
+    Input path of the contraction code for `diagram`
+    """
+
+    return dict(zip(self.params['diagrams'],
+                                         self.params['directories']))[diagram]
+
+  @property
+  def diagrams(self):
+    return self.params['diagrams']
+
+  @property
+  def correlators(self):
+    return wick.set_lookup_correlators(self.params['diagrams'])
+
+  @property
+  def gevp_correlators(self):
+    # the rho analysis needs all correlators, pipi only C4
+    return self.correlators if self.params['flag_ana'] else ['C4']
+
+  def contributing_diagrams(self, correlator):
+    """
+    Diagrams with as many quarklines as `correlator`
+    """
+
+    return [d for d in self.params['diagrams'] if d.startswith(correlator)]
+
+  ##############################################################################
+  # stages
+
+  def raw(self, p_cm, diagram):
+    """
+    Raw data and quantum numbers of `diagram`. See pipeline.read()
+    """
+
+    return self._memoize('raw', p_cm, (diagram,),
+        lambda: pipeline.load_raw(self.params, diagram, p_cm),
+        lambda: pipeline.read(self.params, diagram, self.directory(diagram),
+                                                                         p_cm),
+        lambda value: pipeline.write_raw(self.params, diagram, p_cm, *value))
+
+  def lattice_basis(self, p_cm):
+    """
+    Lattice basis and names of all irreps. See pipeline.get_lattice_basis()
+    """
+
+    return pipeline.get_lattice_basis(self.params, p_cm)
+
+  def irreps(self, p_cm):
+    return self.lattice_basis(p_cm)[1]
+
+  def subduced(self, p_cm, diagram, irrep):
+    """
+    Raw data of `diagram` subduced into `irrep`. See pipeline.subduce()
+    """
+
+    def compute():
+      data, lookup_qn = self.raw(p_cm, diagram)
+      return pipeline.subduce(self.params, data, lookup_qn, diagram, p_cm,
+                                           irrep, self.lattice_basis(p_cm)[0])
+
+    return self._memoize('subduced', p_cm, (diagram, irrep),
+        lambda: pipeline.load_subduced(self.params, diagram, p_cm, irrep),
+        compute,
+        lambda value: pipeline.write_subduced(self.params, diagram, p_cm,
+                                                                 irrep, value))
+
+  def subduced_index(self, p_cm, diagram, irrep):
+    """
+    Selection index of subduced(). See selection.build_index()
+    """
+
+    return self._cached(('subduced_index', p_cm, diagram, irrep),
+        self.digest('subduced', p_cm, diagram, irrep),
+        lambda: selection.build_index(self.subduced(p_cm, diagram, irrep)))
+
+  def contracted(self, p_cm, correlator, irrep):
+    """
+    Wick contracted `correlator` in `irrep`. See pipeline.contract()
+    """
+
+    def compute():
+      diagrams = self.contributing_diagrams(correlator)
+      data = dict(((d, irrep), self.subduced(p_cm, d, irrep)) \
+                                                              for d in diagrams)
+      index = dict(((d, irrep), self.subduced_index(p_cm, d, irrep)) \
+                                                              for d in diagrams)
+      return pipeline.contract(self.params, data, index, correlator, irrep)
+
+    return self._memoize('contracted', p_cm, (correlator, irrep),
+        lambda: pipeline.load_contracted(self.params, correlator, p_cm, irrep),
+        compute,
+        lambda value: pipeline.write_contracted(self.params, correlator, p_cm,
+                                                                 irrep, value))
+
+  def contracted_index(self, p_cm, correlator, irrep):
+    """
+    Selection index of contracted(). See selection.build_index()
+    """
+
+    return self._cached(('contracted_index', p_cm, correlator, irrep),
+        self.digest('contracted', p_cm, correlator, irrep),
+        lambda: selection.build_index(self.contracted(p_cm, correlator, irrep)))
+
+  def averaged(self, p_cm, correlator, irrep):
+    """
+    Contracted data summed over momenta and averaged over rows. See
+    pipeline.average()
+    """
+
+    return self._memoize('averaged', p_cm, (correlator, irrep),
+        lambda: pipeline.load_contracted(self.params, correlator, p_cm, irrep,
+                                                                     avg=True),
+        lambda: pipeline.average(self.contracted(p_cm, correlator, irrep),
+                              self.contracted_index(p_cm, correlator, irrep)),
+        lambda value: pipeline.write_contracted(self.params, correlator, p_cm,
+                                                       irrep, value, avg=True))
+
+  def block_size(self, p_cm):
+    """
+    Resampling block size of the frame `p_cm`. With 'Block size = auto' it is
+    calculated from the averaged data of all correlators and irreps. See 
+    pipeline.get_block_size()
+    """
+
+    if not self.params['auto_block_size']:
+      return self.params['block_size']
+
+    keys = [(c, irrep) for c in self.correlators for irrep in self.irreps(p_cm)]
+    return self._cached(('block_size', p_cm),
+        [self.digest('averaged', p_cm, *key) for key in keys],
+        lambda: pipeline.get_block_size(self.params, 
+                      dict((key, self.averaged(p_cm, *key)) for key in keys)))
+
+  def gevp(self, p_cm, irrep):
+    """
+    Correlator matrices of `irrep`. See pipeline.build_gevp()
+
+    Returns
+    -------
+    list of tuple
+        The names of the irreps and the gevp as pd.DataFrame for every gevp
+    """
+
+    def store(gevps):
+      for irreps, gevp_data in gevps:
+        pipeline.write_gevp(self.params, p_cm, irreps, gevp_data)
+
+    def compute():
+      avg = dict(((c, irrep), self.averaged(p_cm, c, irrep)) \
+                                                 for c in self.gevp_correlators)
+      gevps = pipeline.build_gevp(self.params, avg, irrep)
+      if self.write:
+        store(gevps)
+      return gevps
+
+    # the digest of the gevp is written once it is solved, see scheduler.py
+    key = ('gevp', p_cm, irrep)
+    digest = self.digest('gevp', p_cm, irrep)
+    if key in self._cache and self._cache[key][0] == digest and \
+                                            self._missing('gevp', p_cm, irrep):
+      store(self._cache[key][1])
+    return self._cached(key, digest, compute)
@@ -0,0 +1,284 @@
+# Fits of correlation functions. All resampled copies, all rows of the table
+# and all fit ranges are fitted at once as a single batched nonlinear least
+# squares problem.
+
+import itertools as it
+
+import numpy as np
+import pandas as pd
+from pandas import Series, DataFrame
+
+import resampling
+import utils
+
+################################################################################
+# fit functions. Each returns the function values and the jacobian with respect
+# to the parameters p on the last axis.
+
+def _single(p, t, T, sign):
+  """
+  A * (exp(-E*t) + sign * exp(-E*(T-t))) and its jacobian in (A, E)
+  """
+
+  A = p[...,0:1]
+  E = p[...,1:2]
+
+  e1 = np.exp(-E*t)
+  e2 = sign * np.exp(-E*(T-t))
+
+  f = A * (e1 + e2)
+  J = np.stack([e1 + e2, -A * (t*e1 + (T-t)*e2)], axis=-1)
+
+  return f, J
+
+def _double(p, t, T, sign):
+  """
+  Sum of two single exponential states with parameters (A0, E0, A1, E1)
+  """
+
+  f0, J0 = _single(p[...,0:2], t, T, sign)
+  f1, J1 = _single(p[...,2:4], t, T, sign)
+
+  return f0 + f1, np.concatenate([J0, J1], axis=-1)
+
+models = {
+  'cosh'  : (lambda p, t, T: _single(p, t, T, +1.), ['A0', 'E0']),
+  'sinh'  : (lambda p, t, T: _single(p, t, T, -1.), ['A0', 'E0']),
+  'cosh2' : (lambda p, t, T: _double(p, t, T, +1.), ['A0', 'E0', 'A1', 'E1']),
+  'sinh2' : (lambda p, t, T: _double(p, t, T, -1.), ['A0', 'E0', 'A1', 'E1'])
+}
+
+################################################################################
+
+def set_lookup_fit_ranges(t_min, t_max, min_length):
+  """
+  All fit ranges [t_i, t_f] with t_min <= t_i and t_f <= t_max containing at
+  least `min_length` timeslices
+  """
+
+  return [(ti, tf) for ti, tf in it.combinations(range(t_min, t_max+1), 2) \
+                                                      if tf-ti+1 >= min_length]
+
+def _initial_guess(y, t, T, model, fit_ranges):
+  """
+  Start parameters from the effective mass at the beginning and end of each
+  fit range
+
+  Parameters
+  ----------
+  y : np.array
+      Mean values with shape (rows, T)
+
+  Returns
+  -------
+  np.array
+      Shape (rows, fit ranges, parameters)
+  """
+
+  # positions of the first and last timeslice of every fit range in t
+  ti = np.searchsorted(t, [r[0] for r in fit_ranges])
+  tf = np.searchsorted(t, [r[1] for r in fit_ranges], side='right') - 1
+
+  with np.errstate(divide='ignore', invalid='ignore'):
+    ratio = np.abs(y[:,:-1] / y[:,1:])
+    m_eff = np.log(np.where(ratio > 1., ratio, np.nan))
+  m_eff = np.where(np.isfinite(m_eff), m_eff, 0.1)
+  m_eff = np.concatenate([m_eff, m_eff[:,-1:]], axis=1)
+
+  # ground state from the end of the fit range
+  E0 = m_eff[:,np.minimum(tf, len(t)-2)]
+  A0 = y[:,tf] / np.exp(-E0*t[tf])
+
+  if len(models[model][1]) == 2:
+    return np.stack([A0, E0], axis=-1)
+
+  E1 = np.maximum(m_eff[:,ti], E0) + E0
+  A1 = (y[:,ti] - A0*np.exp(-E0*t[ti])) / np.exp(-E1*t[ti])
+  return np.stack([A0, E0, A1, E1], axis=-1)
+
+def _levenberg_marquardt(function, t, T, y, w, p, nb_iter=2000, tol=1e-7):
+  """
+  Minimize \sum_t w(t) (y(t) - f(p, t))^2 for every batch element at once
+
+  Parameters
+  ----------
+  function : callable
+      Returns f(p, t) and its jacobian
+  y, w : np.array
+      Data and weights with shape (batch, T). Timeslices outside of the fit
+      range have weight 0
+  p : np.array
+      Start parameters with shape (batch, parameters)
+  nb_iter : int, optional
+      Maximal number of iterations
+
+  Returns
+  -------
+  p : np.array
+      Best fit parameters
+  chi2 : np.array
+      Value of the minimized sum
+  converged : np.array
+      Boolean with shape (batch,). False for the batch elements still active
+      after `nb_iter` iterations
+
+  Notes
+  -----
+  Only batch elements that have not converged yet take part in the next
+  iteration.
+  """
+
+  p = p.copy()
+  f, J = function(p, t, T)
+  chi2 = np.sum(w*(y-f)**2, axis=-1)
+  lam = np.full(chi2.shape, 1e-3)
+
+  active = np.arange(len(chi2))
+  eye = np.eye(p.shape[-1])
+
+  for i in range(nb_iter):
+    _J, _w, _y, _f = J[active], w[active], y[active], f[active]
+    JtW = np.swapaxes(_J, -1, -2) * _w[:,np.newaxis,:]
+    H = np.matmul(JtW, _J)
+    g = np.matmul(JtW, (_y-_f)[...,np.newaxis])[...,0]
+
+    # marquardt's scaling of the diagonal
+    diag = np.diagonal(H, axis1=-2, axis2=-1)
+    H = H + (lam[active,np.newaxis]*diag + 1e-300)[...,np.newaxis] * eye
+    delta = np.linalg.solve(H, g[...,np.newaxis])[...,0]
+
+    p_new = p[active] + delta
+    f_new, J_new = function(p_new, t, T)
+    chi2_new = np.sum(_w*(_y-f_new)**2, axis=-1)
+
+    better = np.isfinite(chi2_new) & (chi2_new < chi2[active])
+    # either the improvement is negligible or no step is found anymore
+    converged = np.where(better, chi2[active]-chi2_new <= tol*chi2[active],
+                                                          lam[active] > 1e10)
+
+    update = active[better]
+    p[update] = p_new[better]
+    f[update] = f_new[better]
+    J[update] = J_new[better]
+    chi2[update] = chi2_new[better]
+    lam[active] = np.where(better, lam[active]/10., lam[active]*10.)
+
+    active = active[~converged]
+    if len(active) == 0:
+      break
+
+  converged = np.ones(chi2.shape, dtype=bool)
+  converged[active] = False
+  return p, chi2, converged
+
+def fit(data, T, model, fit_ranges, method='bootstrap', nb_samples=20,
+                                      verbose=False, block_size=1, nb_iter=2000):
+  """
+  Fit all rows of a table of correlation functions for all samples and fit
+  ranges
+
+  Parameters
+  ----------
+  data : pd.DataFrame
+      Table with purely real entries, arbitrary rows and hierarchical columns
+      for gauge configuration number and timeslice
+  T : int
+      Time extent of the lattice
+  model : string, {'cosh', 'sinh', 'cosh2', 'sinh2'}
+      One or two exponential states symmetric or antisymmetric under time
+      reversal
+  fit_ranges : list of tuple of int
+      The fit ranges (t_i, t_f) given as timeslices of `data`, both included
+  method : string, {'bootstrap', 'jackknife'}
+      Resampling method used for the statistical errors
+  nb_samples : int
+      The number of bootstrap samples including the mean
+  block_size : int, optional
+      Number of consecutive configurations resampled together
+  nb_iter : int, optional
+      Maximal number of iterations of the minimization
+
+  Returns
+  -------
+  pd.DataFrame
+      Table with the rows of `data` times 't_i' x 't_f' as rows and columns
+      {'mean', 'std'} x fit parameters and chi^2/dof.
+
+  Notes
+  -----
+  The fit is uncorrelated with the variance of the data as weights. Samples
+  that did not converge within `nb_iter` iterations are NaN, so a fit range
+  whose mean did not converge has NaN as mean and error.
+  """
+
+  function, parameters = models[model]
+
+  data = data.sort_index(axis=1)
+  t = np.asarray(data.columns.get_level_values(1).unique(), dtype=float)
+
+  # the fit ranges are given in timeslices, which need not start at 0 or be
+  # contiguous after missing timeslices were dropped
+  outside = [r for r in fit_ranges if r[0] < t[0] or r[1] > t[-1]]
+  if outside:
+    raise ValueError('in fit: fit ranges %s exceed the timeslices %d to %d '\
+                                 'of the data' % (outside, t[0], t[-1]))
+  mask = np.array([(t >= ti) & (t <= tf) for ti, tf in fit_ranges], 
+                                                                 dtype=float)
+
+  short = [r for r, m in zip(fit_ranges, mask) if m.sum() <= len(parameters)]
+  if short:
+    raise ValueError('in fit: %s has %d parameters, fit ranges need more '\
+            'timeslices than that: %s' % (model, len(parameters), short))
+
+  # (rows, cnfg, T) -> (samples, rows, T)
+  samples = resampling.resample(np.swapaxes(
+            utils.pd_dataframe_to_np_array(data), 0, 1), method, nb_samples,
+                                                         block_size=block_size)
+  std = resampling.error(samples, method)
+
+  if verbose:
+    print '\tfitting %d correlators in %d fit ranges with %s' % \
+                                   (len(data.index), len(fit_ranges), model)
+
+  # only the timeslices covered by any fit range enter
+  used = np.flatnonzero(mask.any(axis=0))
+  window = slice(used[0], used[-1]+1)
+
+  # broadcast to (samples, rows, fit ranges, T) and flatten to one batch axis
+  shape = samples.shape[:2] + (len(fit_ranges),)
+  y = samples[:,:,np.newaxis,window]
+  with np.errstate(divide='ignore'):
+    w = (mask[:,window] / std[:,np.newaxis,window]**2)[np.newaxis]
+  w = np.where(np.isfinite(w), w, 0.)
+  y, w = [np.broadcast_to(a, shape + a.shape[-1:]).reshape((-1,a.shape[-1])) \
+                                                                 for a in (y, w)]
+
+  p = _initial_guess(samples[0], t, T, model, fit_ranges)
+  p = np.broadcast_to(p, samples.shape[:1] + p.shape).reshape(
+                                                        (-1, len(parameters)))
+
+  with np.errstate(over='ignore', invalid='ignore'):
+    p, chi2, converged = _levenberg_marquardt(function, t[window], T, y, w, p,
+                                                                       nb_iter)
+  p[~converged] = np.nan
+  chi2[~converged] = np.nan
+  if verbose and not converged.all():
+    print '\t%d of %d fits did not converge in %d iterations' % (
+                          np.sum(~converged), len(converged), nb_iter)
+  p = p.reshape(shape + (len(parameters),))
+  chi2 = chi2.reshape(shape)
+
+  dof = mask.sum(axis=-1) - len(parameters)
+  values = np.concatenate([p, (chi2/dof)[...,np.newaxis]], axis=-1)
+
+  mean = values[0].reshape((-1, values.shape[-1]))
+  err = resampling.error(values, method).reshape((-1, values.shape[-1]))
+
+  index = [i if isinstance(i, tuple) else (i,) for i in data.index.values]
+  index = pd.MultiIndex.from_tuples([i + r for i in index for r in fit_ranges],
+                         names=list(data.index.names) + ['t_i', 't_f'])
+  columns = pd.MultiIndex.from_product([['mean', 'std'],
+                                                    parameters + ['chi2/dof']])
+
+  return DataFrame(np.concatenate([mean, err], axis=1), index=index,
+                                                                columns=columns)
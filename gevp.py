@@ -0,0 +1,241 @@
+# Solution of the generalized eigenvalue problem for the correlator matrices
+# built by setup_gevp. All samples, timeslices and values of t0 are treated at
+# once as stacks of small matrices.
+
+import numpy as np
+import pandas as pd
+from pandas import Series, DataFrame
+
+import resampling
+import utils
+
+def gevp_to_array(gevp_data):
+  """
+  Reshape the table of gevp elements into a stack of correlator matrices
+
+  Parameters
+  ----------
+  gevp_data : pd.DataFrame
+      Table with a row for each gevp element and hierarchical columns for
+      gauge configuration number and timeslice. The last two index levels
+      must be 'gevp_row' and 'gevp_col'
+
+  Returns
+  -------
+  operators : list
+      The labels of the operators spanning the gevp
+  T : np.array
+      The timeslices contained in `gevp_data`
+  C : np.array
+      Real array with shape (cnfg, T, N, N) where N is the number of operators
+  """
+
+  rows = gevp_data.index.get_level_values('gevp_row')
+  cols = gevp_data.index.get_level_values('gevp_col')
+
+  operators = sorted(set(rows) | set(cols))
+  N = len(operators)
+  assert len(gevp_data.index) == N*N, 'Gevp is not a square matrix'
+
+  position = dict((o, i) for i, o in enumerate(operators))
+  row_pos = np.array([position[r] for r in rows])
+  col_pos = np.array([position[c] for c in cols])
+
+  gevp_data = gevp_data.sort_index(axis=1)
+  T = np.asarray(gevp_data.columns.get_level_values(1).unique())
+  data = utils.pd_dataframe_to_np_array(gevp_data.apply(np.real))
+
+  C = np.empty((data.shape[1], data.shape[2], N, N), dtype=float)
+  C[:,:,row_pos,col_pos] = data.transpose((1,2,0))
+
+  return operators, T, C
+
+def solve(C, t0s):
+  """
+  Solve the generalized eigenvalue problem C(t) v = \lambda(t, t0) C(t0) v
+
+  Parameters
+  ----------
+  C : np.array
+      Real symmetric correlator matrices with shape (samples, T, N, N)
+  t0s : list of int
+      Indices of the timeslices used as reference point t0
+
+  Returns
+  -------
+  eigenvalues : np.array
+      Shape (samples, t0, T, N), sorted descendingly for every t
+  eigenvectors : np.array
+      Shape (samples, t0, T, N, N). Column n is the generalized eigenvector
+      to eigenvalue n, normalized to v^T C(t0) v = 1
+  L : np.array
+      Cholesky factor of C(t0) with shape (samples, t0, 1, N, N)
+
+  Notes
+  -----
+  With C(t0) = L L^T the problem is transformed to the ordinary symmetric
+  eigenvalue problem L^{-1} C(t) L^{-T} u = \lambda u with v = L^{-T} u.
+
+  Samples for which C(t0) is not positive definite get NaN for all
+  timeslices of that t0 instead of aborting the whole stack.
+  """
+
+  # noise makes the matrices slightly asymmetric
+  C = 0.5 * (C + np.swapaxes(C, -1, -2))
+
+  # replace the matrices without cholesky factorization by the identity and
+  # set their results to NaN afterwards
+  C0 = C[:,t0s]
+  eye = np.eye(C.shape[-1])
+  finite = np.all(np.isfinite(C0), axis=(-2,-1))
+  C0 = np.where(finite[...,np.newaxis,np.newaxis], C0, eye)
+  valid = finite & np.all(np.linalg.eigvalsh(C0) > 0, axis=-1)
+  C0 = np.where(valid[...,np.newaxis,np.newaxis], C0, eye)
+
+  # shape (samples, t0, 1, N, N) to broadcast against all timeslices
+  L = np.linalg.cholesky(C0)[:,:,np.newaxis]
+  L_inv = np.linalg.inv(L)
+
+  A = np.matmul(np.matmul(L_inv, C[:,np.newaxis]), np.swapaxes(L_inv, -1, -2))
+  eigenvalues, u = np.linalg.eigh(A)
+
+  # eigh sorts ascendingly
+  eigenvalues = eigenvalues[...,::-1]
+  u = u[...,::-1]
+  eigenvectors = np.matmul(np.swapaxes(L_inv, -1, -2), u)
+
+  eigenvalues[~valid] = np.nan
+  eigenvectors[~valid] = np.nan
+  L[~valid] = np.nan
+
+  return eigenvalues, eigenvectors, L
+
+def effective_energies(eigenvalues):
+  """
+  Effective energies E_n(t) = log(\lambda_n(t) / \lambda_n(t+1))
+
+  Parameters
+  ----------
+  eigenvalues : np.array
+      Array with timeslices on axis -2 and states on axis -1
+
+  Returns
+  -------
+  np.array
+      Same shape as `eigenvalues` with the last timeslice set to NaN. Where the
+      ratio is not positive the effective energy is NaN as well
+  """
+
+  with np.errstate(divide='ignore', invalid='ignore'):
+    ratio = eigenvalues[...,:-1,:] / eigenvalues[...,1:,:]
+    E = np.log(np.where(ratio > 0, ratio, np.nan))
+
+  nan = np.full(E[...,:1,:].shape, np.nan)
+  return np.concatenate([E, nan], axis=-2)
+
+def overlaps(eigenvectors, L, energies, t0s):
+  """
+  Relative overlaps |Z_{in}|^2 / \sum_m |Z_{im}|^2 of operator i with state n
+
+  Parameters
+  ----------
+  eigenvectors : np.array
+      Shape (samples, t0, T, N, N) with the generalized eigenvectors as columns
+  L : np.array
+      Cholesky factor of C(t0), broadcastable to `eigenvectors`
+  energies : np.array
+      Effective energies with shape (samples, t0, T, N)
+  t0s : list of int
+      Reference timeslices
+
+  Notes
+  -----
+  With the normalization v^T C(t0) v = 1 the amplitudes are 
+  Z_n = e^{E_n t0 / 2} C(t0) v_n. The energies are the effective energies of 
+  the same timeslice, so the overlaps are NaN wherever they are.
+  """
+
+  scale = np.exp(0.5 * energies[...,np.newaxis,:] * \
+                       np.asarray(t0s, dtype=float)[:,np.newaxis,np.newaxis,
+                                                                  np.newaxis])
+  Z = (np.matmul(np.matmul(L, np.swapaxes(L, -1, -2)), eigenvectors)*scale)**2
+
+  with np.errstate(divide='ignore', invalid='ignore'):
+    return Z / Z.sum(axis=-1, keepdims=True)
+
+def _to_dataframe(samples, method, index, T):
+  """
+  Pack mean and error of an array with shape (samples, rows..., T) into a
+  pd.DataFrame with columns {'mean', 'std'} x T
+  """
+
+  nb_T = samples.shape[-1]
+  mean = samples[0].reshape((-1, nb_T))
+  std = resampling.error(samples, method).reshape((-1, nb_T))
+
+  columns = pd.MultiIndex.from_product([['mean', 'std'], T], names=[None, 'T'])
+  return DataFrame(np.concatenate([mean, std], axis=1), index=index,
+                                                                columns=columns)
+
+def gevp(gevp_data, t0s, method='bootstrap', nb_samples=20, verbose=False,
+                                                                 block_size=1):
+  """
+  Eigenvalues, effective energies and overlaps of a gevp for all samples and
+  reference timeslices t0
+
+  Parameters
+  ----------
+  gevp_data : pd.DataFrame
+      Table with a row for each gevp element and hierarchical columns for
+      gauge configuration number and timeslice as created by
+      setup_gevp.build_gevp()
+  t0s : list of int
+      Reference timeslices. Each must be one of the timeslices of `gevp_data`
+  method : string, {'bootstrap', 'jackknife'}
+      Resampling method used for the statistical errors
+  nb_samples : int
+      The number of bootstrap samples including the mean
+  block_size : int, optional
+      Number of consecutive configurations resampled together
+
+  Returns
+  -------
+  eigenvalues, energies : pd.DataFrame
+      Tables with rows t0 x n and columns {'mean', 'std'} x T
+  overlaps : pd.DataFrame
+      Table with rows t0 x operator x n and columns {'mean', 'std'} x T
+  """
+
+  operators, T, C = gevp_to_array(gevp_data)
+  N = len(operators)
+
+  missing = [t0 for t0 in t0s if t0 not in T]
+  if missing:
+    raise ValueError('in gevp: t0 = %s not among the %d timeslices of the '\
+                'data from %d to %d' % (', '.join(map(str, missing)), len(T), 
+                                                                T[0], T[-1]))
+  t0_pos = [int(np.searchsorted(T, t0)) for t0 in t0s]
+
+  if verbose:
+    print '\tsolving %d x %d gevp for t0 in' % (N, N), t0s
+
+  # shape (samples, T, N, N)
+  C = resampling.resample(C, method, nb_samples, block_size=block_size)
+
+  with np.errstate(invalid='ignore'):
+    eigenvalues, eigenvectors, L = solve(C, t0_pos)
+  energies = effective_energies(eigenvalues)
+  Z = overlaps(eigenvectors, L, energies, T[t0_pos])
+
+  states = range(N)
+  index = pd.MultiIndex.from_product([t0s, states], names=['t0', 'n'])
+  eigenvalues = _to_dataframe(np.swapaxes(eigenvalues, -1, -2), method,
+                                                                      index, T)
+  energies = _to_dataframe(np.swapaxes(energies, -1, -2), method, index, T)
+
+  # (samples, t0, T, operator, n) -> (samples, t0, operator, n, T)
+  index = pd.MultiIndex.from_product([t0s, operators, states],
+                                                names=['t0', 'operator', 'n'])
+  Z = _to_dataframe(np.transpose(Z, (0,1,3,4,2)), method, index, T)
+
+  return eigenvalues, energies, Z
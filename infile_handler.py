@@ -1,4 +1,5 @@
 import argparse
+import os
 import ConfigParser
 
 def get_parameters():
@@ -17,6 +18,21 @@ def get_parameters():
                         'cyclic-i', 'cyclic-christian'], \
                         default='cyclic-christian',
                         help="continuum basis to be used in the program")
+  # configuration sharded runs
+  parser.add_argument("--shard", nargs=2, type=int, metavar=('INDEX', 'COUNT'),
+                        help="only read, subduce and contract the INDEX-th of "\
+                             "COUNT contiguous parts of the configurations")
+  parser.add_argument("--merge", type=int, metavar='COUNT',
+                        help="concatenate the output of COUNT shards")
+  # single tasks of the task graph for array jobs of a batch system
+  parser.add_argument("--list-units", action="store_true",
+                        help="print all work units of the task graph")
+  parser.add_argument("--unit", type=int, metavar='INDEX',
+                        help="only run the work unit INDEX of --list-units")
+  # resource estimate from the lookup tables only
+  parser.add_argument("--plan", action="store_true",
+                        help="print the expected number of operators, sizes "\
+                             "and file reads of every stage and quit")
   
   args = parser.parse_args()
 
@@ -32,3 +48,294 @@ def get_parameters():
   return args, config
   
  
+# gamma structure wich shall be averaged. Last entry of gamma must contain all
+# names in LaTeX compatible notation for plot labels
+gamma_dictionary = {
+'gamma_i' :   [1, 2, 3, \
+              ['\gamma_1', '\gamma_2', '\gamma_3', '\gamma_i']],
+'gamma_0i' :  [10, 11, 12, \
+              ['\gamma_0\gamma_1', '\gamma_0\gamma_2', '\gamma_0\gamma_3', \
+               '\gamma_0\gamma_i']],
+'gamma_50i' : [13, 14, 15, \
+              ['\gamma_5\gamma_0\gamma_1', '\gamma_5\gamma_0\gamma_2', \
+               '\gamma_5\gamma_0\gamma_3', '\gamma_5\gamma_0\gamma_i']],
+'gamma_5' :   [5, ['\gamma_5']]
+}
+
+def read_infile(infile, basis='cyclic-christian', verbose=False):
+  """
+  Parameters of `infile` as if given to analyse without further options
+
+  Parameters
+  ----------
+  infile : string
+      Name of the infile
+  basis : string, optional
+      Continuum basis as given by the -b option
+  verbose : bool, optional
+      Verbosity as given by the -v option
+
+  Returns
+  -------
+  params : dict
+      See read_parameters()
+  """
+
+  config = ConfigParser.RawConfigParser()
+  if config.read(infile) == []:
+    raise IOError('Could not open infile: %s' % infile)
+  args = argparse.Namespace(infile=infile, basis=basis, verbose=verbose,
+                       shard=None, merge=None, list_units=False, unit=None,
+                       plan=False)
+
+  return read_parameters(config, args)
+
+def shard_outpath(outpath, shard):
+  """
+  Output path of the shard given by its index and the number of shards
+  """
+
+  return os.path.join(outpath, 'shard%d-of-%d' % tuple(shard))
+
+def get_option(config, section, option, default, kind='get'):
+  """
+  Value of `option` in `section` of the infile or `default` if it is missing. 
+  Keeps infiles written before the option existed working
+
+  Parameters
+  ----------
+  config : ConfigParser.RawConfigParser
+      The parsed infile
+  section, option : string
+      Names in the infile
+  default
+      Returned if the infile does not contain `option`
+  kind : string, {'get', 'getint', 'getboolean'}
+      Method of `config` used to read the value
+  """
+
+  if not config.has_option(section, option):
+    return default
+  return getattr(config, kind)(section, option)
+
+def read_parameters(config, args):
+  """
+  Translate the contents of the infile into a dictionary of parameters
+
+  Parameters
+  ----------
+  config : ConfigParser.RawConfigParser
+      The parsed infile
+  args : argparse.Namespace
+      The parsed command line arguments
+
+  Returns
+  -------
+  params : dict
+      All parameters needed to run the analysis. The keys are the names of 
+      the variables used in analyse
+  """
+
+  params = {}
+
+  params['verbose'] = args.verbose
+  params['continuum_basis'] = args.basis
+
+  params['flag_pion']        = config.getboolean('parameters', 'Read pion') 
+  params['flag_read']        = config.getboolean('parameters', 'Read rho') 
+  params['flag_subduction']  = config.getboolean('parameters', 'Subduce')
+  params['flag_contraction'] = config.getboolean('parameters', 'Contract')
+  params['flag_gevp']        = config.getboolean('parameters', 'Create Gevp')
+  params['flag_solve']       = get_option(config, 'parameters', 
+                                              'Solve Gevp', False, 'getboolean')
+  params['flag_fit']         = get_option(config, 'parameters', 
+                                                'Fit data', False, 'getboolean')
+  params['flag_cov']         = get_option(config, 'parameters', 
+                                              'Covariance', False, 'getboolean')
+  params['flag_autocorr']    = get_option(config, 'parameters', 
+                                         'Autocorrelation', False, 'getboolean')
+  params['flag_plot']        = config.getboolean('parameters', 'Plot data')
+  params['flag_old']         = config.getboolean('parameters', 'Old data')
+  params['flag_ana']         = config.getboolean('parameters', 'Rho analysis')
+  params['flag_monitor']     = get_option(config, 'parameters', 
+                                                 'Monitor', False, 'getboolean')
+
+  # in streaming mode all stages are passed in memory and only the stages 
+  # chosen as checkpoints are written to disk
+  params['streaming']        = get_option(config, 'parameters', 
+                                               'Streaming', False, 'getboolean')
+  # without [checkpoints] every stage is written
+  params['checkpoints'] = dict((stage, get_option(config, 'checkpoints', 
+                                                option, True, 'getboolean')) \
+                          for stage, option in [('raw', 'Raw data'), 
+                                ('subduced', 'Subduced data'),
+                                ('contracted', 'Contracted data'), 
+                                ('gevp', 'Gevp data')])
+  # blocks of configurations processed one after the other, see blocked.py
+  params['cnfg_block'] = get_option(config, 'parameters', 
+                                        'Configurations per block', 0, 'getint')
+
+  params['sta_cnfg'] = config.getint('gauge configuration numbers', 
+                                                         'First configuration')
+  params['end_cnfg'] = config.getint('gauge configuration numbers', 
+                                                          'Last configuration')
+  params['del_cnfg'] = config.getint('gauge configuration numbers', \
+                                                      'Configuration stepping')
+  missing_configs = config.get('gauge configuration numbers', \
+                                                      'Missing configurations')
+  # turns missing configs into list of integers
+  if(missing_configs == ''):
+    params['missing_configs'] = []
+  else:
+    params['missing_configs'] = [int(m) for m in missing_configs.split(',')]
+  # run on a subset of configurations only to preview the analysis
+  params['nb_preview'] = get_option(config, 'gauge configuration numbers', 
+                                          'Preview configurations', 0, 'getint')
+  params['preview_selection'] = get_option(config, 
+        'gauge configuration numbers', 'Preview selection', 'strided').strip()
+
+  params['ensemble'] = config.get('ensemble parameters', 'Ensemble Name')
+  params['T'] = config.getint('ensemble parameters', 'T')
+  # average correlators with their time reversed partner when reading and keep
+  # only T/2+1 timeslices in all later stages
+  params['fold'] = get_option(config, 'ensemble parameters', 'Fold', False, 
+                                                                  'getboolean')
+
+  params['p_max'] = config.getint('gevp parameters', 'p_max')
+  p = config.get('gevp parameters', 'p_cm')
+  params['p_cm'] = [int(k) for k in p.split(',')]
+  gamma_input = config.get('gevp parameters', 'Dirac structure')
+  # translates list of names for gamma structures to indices used in 
+  # contraction code
+  gamma_input = gamma_input.replace(" ", "").split(',')
+  params['gamma_input'] = gamma_input
+  params['gammas'] = [gamma_dictionary[g] for g in gamma_input]
+
+  t0s = get_option(config, 'gevp parameters', 't0', '1')
+  params['t0s'] = [int(t0) for t0 in t0s.split(',')]
+  params['resampling'] = get_option(config, 'gevp parameters', 'Resampling', 
+                                                            'bootstrap').strip()
+  params['shrinkage'] = get_option(config, 'gevp parameters', 
+                                     'Covariance shrinkage', True, 'getboolean')
+
+  diagrams = config.get('contraction details', 'Diagram')
+  params['diagrams'] = diagrams.replace(" ", "").split(',')
+  directories = config.get('contraction details', 'Input Path')
+  directories = directories.replace(" ", "").replace("\n", "")
+  directories = directories.split(',')
+  # use the same directory for all diagrams if only one is given
+  if(len(directories) == 1):
+    directories = directories*len(params['diagrams'])
+  params['directories'] = directories
+
+  params['outpath'] = config.get('other parameters', 'Output Path')
+  # previews are written into a seperate tree not to mix them with the results
+  # of the full ensemble
+  if params['nb_preview'] > 0:
+    params['outpath'] = os.path.join(params['outpath'], 'preview')
+
+  # every shard writes into its own tree. They are concatenated with --merge
+  params['shard'] = tuple(args.shard) if args.shard else None
+  params['merge'] = args.merge
+  params['list_units'] = args.list_units
+  params['unit'] = args.unit
+  params['plan'] = args.plan
+  if params['shard'] is not None:
+    if not 0 <= params['shard'][0] < params['shard'][1]:
+      print "Error! Shard index must be smaller than the number of shards"
+      exit(-1)
+    params['outpath'] = shard_outpath(params['outpath'], params['shard'])
+    if params['cnfg_block'] > 0:
+      print "Error! Configurations per block cannot be used with --shard"
+      exit(-1)
+
+  params['sep_rows_sep_mom'] = config.getboolean('plot details', 
+                                                       'Plot sep_rows_sep_mom') 
+  params['sep_rows_sum_mom'] = config.getboolean('plot details', 
+                                                       'Plot sep_rows_sum_mom') 
+  params['avg_rows_sep_mom'] = config.getboolean('plot details', 
+                                                       'Plot avg_rows_sep_mom')
+  params['avg_rows_sum_mom'] = config.getboolean('plot details', 
+                                                       'Plot avg_rows_sum_mom')
+  params['logscale'] = config.getboolean('plot details', 'Logscale')
+  params['bootstrapsize'] = config.getint('plot details', 
+                                                 'Number of bootstrap samples')
+  params['plot_resampling'] = get_option(config, 'plot details', 'Resampling',
+                                                            'bootstrap').strip()
+  # number of processes rendering pdfs in parallel
+  params['plot_processes'] = get_option(config, 'plot details', 'Processes', 1,
+                                                                      'getint')
+  # none, pdf for faster pdfs without legends or png for one downsampled grid
+  # per irrep
+  quick_look = get_option(config, 'plot details', 'Quick look', 
+                                                       'none').strip().lower()
+  if quick_look not in ['none', 'pdf', 'png']:
+    print "Error! Quick look must be none, pdf or png: ", quick_look
+    exit(-1)
+  params['quick_look'] = None if quick_look == 'none' else quick_look
+  # number of consecutive configurations resampled together. Used for the 
+  # plots as well as for the gevp and the fits
+  # 'auto' takes the block size suggested by the autocorrelation analysis
+  block_size = get_option(config, 'plot details', 'Block size', '1').strip()
+  params['auto_block_size'] = (block_size == 'auto')
+  params['block_size'] = 1 if params['auto_block_size'] else int(block_size)
+
+  params['fit_model'] = get_option(config, 'fit details', 'Model', 
+                                                                 'cosh').strip()
+  fit_interval = get_option(config, 'fit details', 'Fit interval', '8, 20')
+  params['fit_interval'] = [int(t) for t in fit_interval.split(',')]
+  params['fit_min_length'] = get_option(config, 'fit details', 
+                                        'Minimal fit range length', 5, 'getint')
+  # iterations of the minimization before a fit counts as not converged
+  params['fit_iterations'] = get_option(config, 'fit details', 'Iterations', 
+                                                                2000, 'getint')
+  if params['flag_fit']:
+    import fit
+    if params['fit_model'] not in fit.models:
+      print "Error! Unknown fit model: ", params['fit_model']
+      exit(-1)
+    nb_parameters = len(fit.models[params['fit_model']][1])
+    if params['fit_min_length'] <= nb_parameters:
+      print "Error! Minimal fit range length must be larger than the %d "\
+                  "parameters of %s" % (nb_parameters, params['fit_model'])
+      exit(-1)
+
+  # watching the input paths while configurations are produced. Defaults to 
+  # all diagrams
+  diagrams = get_option(config, 'monitor', 'Diagram', 
+                                                   ','.join(params['diagrams']))
+  params['monitor_diagrams'] = diagrams.replace(" ", "").split(',')
+  unknown = sorted(set(params['monitor_diagrams']) - set(params['diagrams']))
+  if unknown:
+    print "Error! Monitored diagrams must be listed under Diagram in "\
+                              "[contraction details]: ", ', '.join(unknown)
+    exit(-1)
+  operators = get_option(config, 'monitor', 'Operators', '').replace(" ", "")
+  params['monitor_operators'] = [int(op) for op in operators.split(',')] \
+                                                          if operators else []
+  params['monitor_interval'] = get_option(config, 'monitor', 'Interval', 600,
+                                                                      'getint')
+  params['monitor_min_age'] = get_option(config, 'monitor', 'Minimal file age',
+                                                                  60, 'getint')
+
+  params['task_graph'] = get_option(config, 'scheduler', 'Task graph', False,
+                                                                  'getboolean')
+  params['processes'] = get_option(config, 'scheduler', 'Processes', 1, 
+                                                                      'getint')
+  params['memory_limit'] = get_option(config, 'scheduler', 'Memory limit', 0,
+                                                                      'getint')
+  params['cache'] = get_option(config, 'scheduler', 'Cache', False, 
+                                                                  'getboolean')
+  params['memory_budget'] = get_option(config, 'scheduler', 'Memory budget', 0,
+                                                                      'getint')
+  # None uses the directory of the tempfile module
+  params['scratch'] = get_option(config, 'scheduler', 'Scratch', None)
+
+  if params['verbose']:
+    print '#################################################################'\
+                                                               '###############'
+    print 'Reading infile'
+    for key in sorted(params.keys()):
+      print key, '=', params[key]
+
+  return params
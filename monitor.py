@@ -0,0 +1,208 @@
+# Monitor the statistics of correlators while the contraction code is still
+# producing configurations. Every new file is read once and folded into
+# running means and second moments (Welford), so the memory needed does not
+# grow with the number of configurations.
+
+import glob
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+from pandas import Series, DataFrame
+
+import raw_data
+import utils
+import pipeline
+
+def new_state(lookup_qn):
+  """
+  Empty running statistics for the operators in `lookup_qn`. Configurations
+  whose file lacks operators are kept in 'skipped' with the modification time
+  of the file
+  """
+
+  return {'n' : 0, 'mean' : None, 'M2' : None, 'cnfgs' : set(),
+                                    'skipped' : {}, 'lookup_qn' : lookup_qn}
+
+def update(state, x):
+  """
+  Add one gauge configuration to the running statistics
+
+  Parameters
+  ----------
+  state : dict
+      Running statistics as created by new_state()
+  x : np.array
+      Complex correlators of one configuration with shape (T, operators)
+
+  Notes
+  -----
+  Real and imaginary part are accumulated independently. The real part of M2
+  is the sum of squared deviations of the real part and likewise for the
+  imaginary part.
+  """
+
+  if state['n'] == 0:
+    state['mean'] = np.zeros(x.shape, dtype=complex)
+    state['M2'] = np.zeros(x.shape, dtype=complex)
+
+  state['n'] += 1
+  delta = x - state['mean']
+  state['mean'] += delta / state['n']
+  delta2 = x - state['mean']
+  state['M2'] += delta.real*delta2.real + 1j*delta.imag*delta2.imag
+
+def summary(state, T):
+  """
+  Mean and standard error of the real part of all monitored operators
+
+  Returns
+  -------
+  pd.DataFrame
+      Table with the operators as rows and columns {'mean', 'std'} x T
+  """
+
+  n = state['n']
+  with np.errstate(divide='ignore', invalid='ignore'):
+    std = np.sqrt(state['M2'].real / (n*(n-1.)))
+
+  columns = pd.MultiIndex.from_product([['mean', 'std'], range(T)])
+  return DataFrame(np.concatenate([state['mean'].real.T, std.T], axis=1),
+                                 index=state['lookup_qn'].index, columns=columns)
+
+def available_cnfgs(params, diagram, directory, min_age):
+  """
+  Configuration numbers of all complete files of `diagram` in `directory`
+
+  Only files belonging to the configuration range of the infile and not
+  modified during the last `min_age` seconds are taken, as younger files may
+  still be written
+
+  Returns
+  -------
+  dict
+      Modification time of the file of every configuration number
+  """
+
+  lookup_cnfg = set(raw_data.set_lookup_cnfg(params['sta_cnfg'],
+                  params['end_cnfg'], params['del_cnfg'],
+                                                    params['missing_configs']))
+
+  pattern = re.compile(r'%s_cnfg(\d+)\.h5$' % re.escape(diagram))
+  now = time.time()
+
+  cnfgs = {}
+  for filename in glob.glob(os.path.join(directory, '%s_cnfg*.h5' % diagram)):
+    match = pattern.search(filename)
+    if match is None or int(match.group(1)) not in lookup_cnfg:
+      continue
+    mtime = os.path.getmtime(filename)
+    if now - mtime < min_age:
+      continue
+    cnfgs[int(match.group(1))] = mtime
+
+  return cnfgs
+
+def scan(params, states):
+  """
+  Read all configurations that appeared since the last scan and update the
+  running statistics
+
+  Returns
+  -------
+  int
+      The number of configurations read
+  """
+
+  verbose = params['verbose']
+  directories = dict(zip(params['diagrams'], params['directories']))
+
+  nb_read = 0
+  for (diagram, p_cm), state in sorted(states.items()):
+    cnfgs = available_cnfgs(params, diagram, directories[diagram],
+                                                    params['monitor_min_age'])
+    for cnfg, mtime in sorted(cnfgs.items()):
+      if cnfg in state['cnfgs'] or state['skipped'].get(cnfg) == mtime:
+        continue
+      try:
+        data = raw_data.read([cnfg], state['lookup_qn'], diagram, params['T'],
+                                                    directories[diagram], 0)
+      except IOError:
+        # try again on the next scan
+        continue
+      if data.shape[1] != len(state['lookup_qn']):
+        # operators missing in the file. It is only read again once it changed
+        print 'Warning: %s cnfg %d lacks operators, skipped until the file '\
+                                               'changes' % (diagram, cnfg)
+        state['skipped'][cnfg] = mtime
+        continue
+      state['skipped'].pop(cnfg, None)
+      update(state, np.asarray(data.values))
+      state['cnfgs'].add(cnfg)
+      nb_read += 1
+
+    if verbose:
+      print '\t%s p_cm = %d: %d configurations' % (diagram, p_cm, state['n'])
+
+  return nb_read
+
+def write(params, states):
+  """
+  Write a summary table and a quick-look png for every monitored diagram
+  """
+
+  import plot
+
+  path = pipeline.set_path(params, 'monitor')
+  for (diagram, p_cm), state in sorted(states.items()):
+    if state['n'] < 2:
+      continue
+
+    table = summary(state, params['T'])
+    filename = 'Monitor_%s_p%1i.h5' % (diagram, p_cm)
+    utils.write_hdf5_correlators(path, filename, table, 'data',
+                                                            params['verbose'])
+
+    pages = [{'title' : 'operator %s' % op,
+              'ylabel' : r'$%s(t/a)$, %d cnfg' % (diagram, state['n']),
+              'logscale' : params['logscale'], 'legend' : False,
+              'graphs' : [{'label' : None, 'T' : np.arange(params['T']),
+                           'mean' : row['mean'].values,
+                           'std' : row['std'].values,
+                           'fmt' : 'o', 'color' : 'black', 'width' : 0.5}]} \
+                                              for op, row in table.iterrows()]
+    plot.render_grid((path, 'Monitor_%s_p%1i.png' % (diagram, p_cm), pages))
+
+def run(params, once=False):
+  """
+  Watch the input paths for new configurations
+
+  Parameters
+  ----------
+  params : dict
+      Parameters as returned by infile_handler.read_parameters()
+  once : bool, optional
+      Only scan the input paths a single time instead of running until
+      interrupted
+  """
+
+  states = {}
+  for p_cm in params['p_cm']:
+    for diagram in params['monitor_diagrams']:
+      lookup_qn = raw_data.set_lookup_qn(diagram, p_cm, params['p_max'],
+                                      params['gammas'], skip=params['flag_ana'])
+      if len(params['monitor_operators']) > 0:
+        lookup_qn = lookup_qn.loc[[op for op in params['monitor_operators'] \
+                                                       if op in lookup_qn.index]]
+      states[(diagram, p_cm)] = new_state(lookup_qn)
+
+  while True:
+    nb_read = scan(params, states)
+    print 'read %d new configurations' % nb_read
+    if nb_read > 0:
+      write(params, states)
+    if once:
+      break
+    time.sleep(params['monitor_interval'])
@@ -0,0 +1,502 @@
+# The stages of the analysis: reading the raw data, subduction into irreducible
+# representations, Wick contraction, averaging and construction of the gevp.
+# Every stage takes the data of the previous one in memory. Writing to and
+# reading from disk is done explicitly with the write_* and load_* functions so
+# that intermediate results are only serialized when they are wanted as
+# checkpoints.
+
+import os
+
+import numpy as np
+import pandas as pd
+from pandas import Series, DataFrame
+
+import raw_data
+import utils
+import wick
+import selection
+import subduction
+import setup_gevp
+import gevp
+import autocorrelation
+
+# subdirectories of the output path for every stage
+lookup_stage_dirs = {
+  'raw'        : '0_raw-data',
+  'subduced'   : '1_subduced-data',
+  'contracted' : '2_contracted-data',
+  'gevp'       : '3_gevp-data',
+  'plot'       : '4_plots',
+  'fit'        : '5_fit-data',
+  'monitor'    : '6_monitor-data'
+}
+
+def set_path(params, stage):
+  """
+  Directory the output of `stage` is written to
+  """
+
+  return '%s/%s/%s/' % (params['outpath'], params['ensemble'],
+                                                      lookup_stage_dirs[stage])
+
+def is_checkpoint(params, stage):
+  """
+  Whether the output of `stage` shall be written to disk. Outside of the
+  streaming mode every stage is written
+  """
+
+  return not params['streaming'] or params['checkpoints'].get(stage, True)
+
+def write(params, stage, filename, data, key='data', verbose=None):
+  """
+  Write `data` into the directory of `stage` if it is a checkpoint
+  """
+
+  if verbose is None:
+    verbose = params['verbose']
+  if is_checkpoint(params, stage):
+    utils.write_hdf5_correlators(set_path(params, stage), filename, data, key,
+                                                                       verbose)
+
+def append(params, stage, filename, data, block, axis, key='data', 
+                                                                 verbose=None):
+  """
+  Write `data` as block `block` of the configurations into the directory of 
+  `stage` if it is a checkpoint. See utils.append_hdf5_correlators()
+  """
+
+  if verbose is None:
+    verbose = params['verbose']
+  if is_checkpoint(params, stage):
+    path = set_path(params, stage)
+    if block == 0 and os.path.isfile(path + filename + '.key'):
+      # the digest is written once all blocks are appended
+      os.remove(path + filename + '.key')
+    utils.append_hdf5_correlators(path, filename, data, key, block, axis, 
+                                                                       verbose)
+
+def load(params, stage, filename, key='data'):
+  """
+  Read the output of `stage` from disk
+  """
+
+  return utils.read_hdf5_correlators(set_path(params, stage)+filename, key)
+
+def write_digest(params, stage, filename, digest):
+  """
+  Record the digest of the inputs of an output file of `stage` in the file
+  `filename`.key next to it
+  """
+
+  if is_checkpoint(params, stage):
+    path = set_path(params, stage) + filename
+    utils.ensure_dir(os.path.dirname(path))
+    with open(path + '.key', 'w') as f:
+      f.write(digest + '\n')
+
+def read_digest(params, stage, filename):
+  """
+  The digest written by write_digest() or None if there is none
+  """
+
+  try:
+    with open(set_path(params, stage) + filename + '.key') as f:
+      return f.read().strip()
+  except IOError:
+    return None
+
+################################################################################
+# reading
+
+# tables that do not depend on the ensemble. They are calculated once per 
+# process and shared by all ensembles. Worker processes forked afterwards 
+# inherit them
+_shared_tables = {}
+
+def _shared_table(key, compute):
+  if key not in _shared_tables:
+    _shared_tables[key] = compute()
+  return _shared_tables[key]
+
+def get_lookup_qn(params, diagram, p_cm):
+  """
+  Quantum numbers of all operators of `diagram`. See raw_data.set_lookup_qn()
+  """
+
+  # TODO: that needs to be refactored when going to a larger operator basis
+  key = ('qn', diagram, p_cm, params['p_max'], repr(params['gammas']),
+                                                             params['flag_ana'])
+  return _shared_table(key, lambda: raw_data.set_lookup_qn(diagram, p_cm, 
+                   params['p_max'], params['gammas'], skip=params['flag_ana'], 
+                                             verbose=params['verbose'])).copy()
+
+def read(params, diagram, directory, p_cm):
+  """
+  Read the raw data of one diagram in one center of mass frame
+
+  Returns
+  -------
+  data : pd.DataFrame
+      See raw_data.read()
+  lookup_qn : pd.DataFrame
+      The quantum numbers of all operators in `data`
+  """
+
+  verbose = params['verbose']
+
+  lookup_cnfg = raw_data.set_lookup_cnfg(params['sta_cnfg'],
+        params['end_cnfg'], params['del_cnfg'], params['missing_configs'],
+        verbose, params['nb_preview'], params['preview_selection'], 
+                                                         shard=params['shard'])
+
+  lookup_qn = get_lookup_qn(params, diagram, p_cm)
+
+  if params['flag_old']:
+    data = raw_data.read_old(lookup_cnfg, lookup_qn, diagram, params['T'],
+                                         directory, verbose, params['fold'])
+  else:
+    data = raw_data.read(lookup_cnfg, lookup_qn, diagram, params['T'],
+                                         directory, verbose, params['fold'])
+
+  return data, lookup_qn
+
+def write_raw(params, name, p_cm, data, lookup_qn):
+  # TODO: Writing into same file only works in append mode
+  write(params, 'raw', '%s_p%1i.h5' % (name, p_cm), data, 'data')
+  write(params, 'raw', '%s_p%1i_qn.h5' % (name, p_cm), lookup_qn, 'qn',
+                                                                 verbose=False)
+
+def load_raw(params, name, p_cm):
+  data = load(params, 'raw', '%s_p%1i.h5' % (name, p_cm), 'data')
+  lookup_qn = load(params, 'raw', '%s_p%1i_qn.h5' % (name, p_cm), 'qn')
+  return data, lookup_qn
+
+################################################################################
+# subduction
+
+def get_lattice_basis(params, p_cm):
+  """
+  Lattice basis for the frame `p_cm` and the names of all contributing
+  irreducible representations
+  """
+
+  j_ana = 1 if params['flag_ana'] else 0
+  basis = _shared_table(('basis', p_cm, j_ana), 
+              lambda: subduction.get_lattice_basis(p_cm, params['verbose'], 
+                                                                      j=j_ana))
+
+  return basis, basis['Irrep'].unique()
+
+def get_lookup_qn_irrep(params, lookup_qn, diagram, p_cm, irrep, basis):
+  """
+  Coefficients and quantum numbers needed to subduce `diagram` into `irrep`.
+  See subduction.set_lookup_qn_irrep()
+
+  Notes
+  -----
+  `lookup_qn` must be the one returned by get_lookup_qn()
+  """
+
+  verbose = params['verbose']
+
+  key = (diagram, repr(params['gammas']), p_cm, irrep, 
+                               params['continuum_basis'], params['flag_ana'])
+  # read coefficients for correlation function, little group and irreducible
+  # representation given by diagram, p_cm irrep and mult
+  coefficients_irrep = _shared_table(('coefficients',) + key, 
+         lambda: subduction.get_coefficients(diagram, params['gammas'], p_cm, 
+                              irrep, basis, params['continuum_basis'], verbose))
+
+  return _shared_table(('qn_irrep', params['p_max']) + key, 
+         lambda: subduction.set_lookup_qn_irrep(coefficients_irrep, lookup_qn, 
+                                                                      verbose))
+
+def precompute_tables(params):
+  """
+  Calculate all tables shared between ensembles for the frames, diagrams and 
+  irreps of `params`
+  """
+
+  for p_cm in params['p_cm']:
+    basis, irreps = get_lattice_basis(params, p_cm)
+    for diagram in params['diagrams']:
+      lookup_qn = get_lookup_qn(params, diagram, p_cm)
+      for irrep in irreps:
+        get_lookup_qn_irrep(params, lookup_qn, diagram, p_cm, irrep, basis)
+
+def subduce(params, data, lookup_qn, diagram, p_cm, irrep, basis):
+  """
+  Subduce the raw data of one diagram into `irrep`
+
+  Returns
+  -------
+  subduced : pd.DataFrame
+      See subduction.ensembles()
+  """
+
+  lookup_qn_irrep = get_lookup_qn_irrep(params, lookup_qn, diagram, p_cm, 
+                                                                 irrep, basis)
+
+  return subduction.ensembles(data, lookup_qn_irrep)
+
+def write_subduced(params, diagram, p_cm, irrep, subduced):
+  write(params, 'subduced', '/%s_p%1i_%s.h5' % (diagram, p_cm, irrep),
+                                                                      subduced)
+
+def load_subduced(params, diagram, p_cm, irrep):
+  return load(params, 'subduced', '/%s_p%1i_%s.h5' % (diagram, p_cm, irrep))
+
+################################################################################
+# contraction
+
+def contract(params, subduced_data, subduced_index, correlator, irrep):
+  """
+  Wick contraction of the subduced diagrams contributing to `correlator`
+  """
+
+  if params['flag_ana']:
+    # rho analysis
+    return wick.rho(subduced_data, correlator, irrep, params['verbose'],
+                                                                subduced_index)
+  # pipi I=2 analysis needs no selection index
+  return wick.pipi(subduced_data, correlator, irrep, params['verbose'])
+
+def average(contracted, index=None):
+  """
+  Sum over gamma structures and equivalent momenta and average over rows
+
+  Parameters
+  ----------
+  contracted : pd.DataFrame
+      Contracted data
+  index : dict, optional
+      Precomputed selection index of `contracted`
+
+  Returns
+  -------
+  pd.DataFrame
+      Table with one row per gevp element. Only the real part is kept as only
+      it is physically relevant at that point
+  """
+
+  if index is None:
+    index = selection.build_index(contracted)
+
+  avg = selection.group_reduce(contracted.apply(np.real), index,
+                                                              ['gevp', 'row'])
+  return selection.group_reduce(avg, selection.build_index(avg), ['gevp'],
+                                                                        'mean')
+
+def write_contracted(params, correlator, p_cm, irrep, contracted, avg=False):
+  filename = '/%s_p%1i_%s_avg.h5' if avg else '/%s_p%1i_%s.h5'
+  write(params, 'contracted', filename % (correlator, p_cm, irrep), contracted)
+
+def load_contracted(params, correlator, p_cm, irrep, avg=False):
+  filename = '/%s_p%1i_%s_avg.h5' if avg else '/%s_p%1i_%s.h5'
+  return load(params, 'contracted', filename % (correlator, p_cm, irrep))
+
+def autocorrelation_times(contracted_data_avg, verbose=False):
+  """
+  Integrated autocorrelation times of all averaged correlators of one frame in
+  one table. See autocorrelation.analyse()
+
+  Parameters
+  ----------
+  contracted_data_avg : dict or store.ArtifactStore.stage()
+      Averaged data keyed by (correlator, irrep)
+
+  Notes
+  -----
+  Every row is treated on its own, so the correlators are read one after the 
+  other and only their autocorrelation times are kept
+  """
+
+  tau_data = {}
+  for key in sorted(contracted_data_avg.keys()):
+    data = contracted_data_avg[key]
+    data = data.dropna(axis=0,how='all').dropna(axis=1,how='all')
+    if not data.empty:
+      tau_data[key] = autocorrelation.analyse(data, verbose)
+  return pd.concat(tau_data, names=['correlator', 'irrep'])
+
+def get_block_size(params, contracted_data_avg, tau_data=None):
+  """
+  Number of consecutive configurations resampled together in one frame
+
+  Parameters
+  ----------
+  contracted_data_avg : dict or store.ArtifactStore.stage()
+      Averaged data of all correlators and irreps of the frame keyed by 
+      (correlator, irrep). Only used with 'Block size = auto'
+  tau_data : pd.DataFrame, optional
+      Result of autocorrelation_times() if it was already calculated
+
+  Returns
+  -------
+  int
+      The block size of the infile or for 'auto' the one suggested by the 
+      integrated autocorrelation times, see autocorrelation.block_size()
+  """
+
+  if not params['auto_block_size']:
+    return params['block_size']
+  if tau_data is None:
+    tau_data = autocorrelation_times(contracted_data_avg)
+  return autocorrelation.block_size(tau_data['tau_int'])
+
+################################################################################
+# gevp
+
+def build_gevp(params, contracted_data_avg, irrep):
+  """
+  Correlator matrices for one irrep
+
+  Returns
+  -------
+  list of tuple
+      For the rho analysis one gevp for `irrep`, for pipi one gevp for each
+      target irrep contained in the C4 correlator. Each entry contains the list
+      of irreps naming the gevp and the gevp as pd.DataFrame
+  """
+
+  if params['flag_ana']:
+    return [([irrep], setup_gevp.build_gevp(contracted_data_avg, irrep,
+                                                           params['verbose']))]
+
+  gevp_data = contracted_data_avg[("C4", irrep)]
+  # NOTE: Delete all rows and colums with only NaN's
+  gevp_data = gevp_data.dropna(axis=0,how='all').dropna(axis=1,how='all')
+
+  # loop over target irreps
+  return [([irrep, tirr], select) \
+                             for tirr, select in gevp_data.groupby(level=[0])]
+
+def write_gevp(params, p_cm, irreps, gevp_data):
+  if not is_checkpoint(params, 'gevp'):
+    return
+  verbose = params['verbose']
+
+  path = set_path(params, 'gevp')
+  filename = 'Gevp_p%1i_%s.h5' % (p_cm, '_'.join(irreps))
+  utils.write_hdf5_correlators(path, filename, gevp_data, 'data', verbose)
+
+  path = '%sp%1i/%s/' % (path, p_cm, '/'.join(irreps))
+  utils.write_ascii_gevp(path, gevp_data, p_cm, irreps[0], verbose, 
+                                                  params['T'], params['fold'])
+
+def solve_gevp(params, gevp_data, name):
+  """
+  Solve the gevp for all samples and t0 and write eigenvalues, effective
+  energies and overlaps to disk
+  """
+
+  verbose = params['verbose']
+  eigenvalues, energies, overlaps = gevp.gevp(gevp_data, params['t0s'],
+                      params['resampling'], params['bootstrapsize'], verbose, 
+                                                          params['block_size'])
+
+  path = set_path(params, 'gevp')
+  utils.write_hdf5_correlators(path, '%s_eigenvalues.h5' % name, eigenvalues,
+                                                               'data', verbose)
+  utils.write_hdf5_correlators(path, '%s_energies.h5' % name, energies,
+                                                               'data', verbose)
+  utils.write_hdf5_correlators(path, '%s_overlaps.h5' % name, overlaps,
+                                                               'data', verbose)
+
+################################################################################
+# plotting
+
+def plot_jobs(params, p_cm, irrep, contracted_data, contracted_index, 
+                                                      contracted_data_avg=None):
+  """
+  Pages of all plots of one irrep
+
+  Parameters
+  ----------
+  contracted_data, contracted_index : dict
+      Contracted data and its selection index for all correlators, keyed by
+      (correlator, irrep)
+  contracted_data_avg : dict, optional
+      Averaged data. The gevp is only plotted if it is given
+
+  Returns
+  -------
+  list of tuple
+      Path, filename and pages of every plot. See plot.render()
+  """
+
+  # matplotlib is only loaded when something is plotted
+  import plot
+
+  verbose = params['verbose']
+  bootstrapsize = params['bootstrapsize']
+  logscale = params['logscale']
+  method = params['plot_resampling']
+  block_size = params['block_size']
+  correlators = wick.set_lookup_correlators(params['diagrams'])
+
+  path = '%s/p%1i/%s/' % (set_path(params, 'plot'), p_cm, irrep)
+
+  # the resampling is linear. Resample every correlator once and let all
+  # plots sum, average and take real or imaginary part of the samples
+  samples = {}
+  for correlator in correlators:
+    samples[correlator] = plot.resample(contracted_data[(correlator,irrep)], 
+                                            bootstrapsize, method, block_size)
+
+  jobs = []
+  for correlator in correlators:
+    data = contracted_data[(correlator,irrep)]
+    index = contracted_index[(correlator,irrep)]
+
+    if params['sep_rows_sum_mom']:
+      filename = '/%s_sep_rows_sum_mom_p%1i_%s_%s.pdf' % (correlator, p_cm, 
+                                               irrep, params['continuum_basis'])
+      jobs.append((path, filename, 
+          plot.sep_rows_sum_mom(data, correlator, bootstrapsize, None, 
+                                 logscale, verbose, index, method, block_size, 
+                                                         samples[correlator])))
+
+    if params['avg_rows_sep_mom']:
+      filename = '%s_avg_rows_sep_mom_p%1i_%s.pdf' % (correlator, p_cm, irrep)
+      jobs.append((path, filename, 
+          plot.avg_rows_sep_mom(data, correlator, bootstrapsize, None, 
+                                 logscale, verbose, index, method, block_size, 
+                                                         samples[correlator])))
+
+    if params['sep_rows_sep_mom']:
+      filename = '%s_sep_rows_sep_mom_real_p%1i_%s.pdf' % (correlator, p_cm, 
+                                                                         irrep)
+      jobs.append((path, filename, 
+          plot.sep_rows_sep_mom(data, correlator, bootstrapsize, None, 
+                                 logscale, verbose, index, method, block_size, 
+                                          samples[correlator].apply(np.real))))
+
+      filename = '%s_sep_rows_sep_mom_imag_p%1i_%s.pdf' % (correlator, p_cm, 
+                                                                         irrep)
+      jobs.append((path, filename, 
+          plot.sep_rows_sep_mom(data, correlator, bootstrapsize, None, 
+                                 logscale, verbose, index, method, block_size, 
+                                          samples[correlator].apply(np.imag))))
+
+  if contracted_data_avg is not None:
+    if params['avg_rows_sum_mom']:
+      gevp_data = contracted_data_avg[("C4", irrep)].\
+                               dropna(axis=0,how='all').dropna(axis=1,how='all')
+      # the samples of the averaged data are the averaged samples
+      gevp_samples = average(samples["C4"], contracted_index[("C4",irrep)])
+      gevp_samples = gevp_samples.dropna(axis=0,how='all').\
+                                                        dropna(axis=1,how='all')
+      filename = 'Gevp_p%1i_%s.pdf' % (p_cm, irrep)
+      jobs.append((path, filename, 
+          plot.avg_row_sum_mom(gevp_data, bootstrapsize, None, logscale,
+                                   verbose, method, block_size, gevp_samples)))
+  else:
+    print 'Warning: skipped avg_rows_sum_mom because gevp is incomplete'
+
+  # all pages of the irrep as panels of one png
+  if params['quick_look'] == 'png':
+    jobs = [(path, 'quick-look_p%1i_%s.png' % (p_cm, irrep), 
+                                   [page for job in jobs for page in job[2]])]
+
+  return jobs
@@ -0,0 +1,133 @@
+# Estimate the resources of a run from the lookup tables alone. No contraction
+# data is touched, so the plan is available before a job is submitted.
+
+import pandas as pd
+from pandas import DataFrame
+
+import raw_data
+import pipeline
+import wick
+
+# bytes per number in the raw, subduced and contracted data and in the
+# averaged data, which only keeps the real part
+lookup_bytes = {'raw' : 16, 'subduced' : 16, 'contracted' : 16, 'averaged' : 8}
+
+# index levels of the subduced data. See subduction.ensembles()
+lookup_index = ['Irrep', 'gevp_row', 'gevp_col', '\mu', 'p_{so}',
+             '\gamma_{so}', 'p_{si}', '\gamma_{si}', 'mult_{so}', 'mult_{si}']
+
+def _rows(params, p_cm):
+  """
+  Operators of every stage in the frame `p_cm`
+
+  Returns
+  -------
+  list of tuple
+      Stage, diagram or correlator, irrep, number of operators and for the
+      raw data the number of numbers stored per timeslice in the input files
+  """
+
+  diagrams = params['diagrams']
+  basis, irreps = pipeline.get_lattice_basis(params, p_cm)
+
+  rows = []
+  qn_irrep = {}
+  for diagram in diagrams:
+    lookup_qn = pipeline.get_lookup_qn(params, diagram, p_cm)
+    # C4+D is stored as two complex numbers per timeslice
+    rows.append(('raw', diagram, '', len(lookup_qn),
+                                              2 if diagram == 'C4+D' else 1))
+    for irrep in irreps:
+      qn_irrep[(diagram, irrep)] = pipeline.get_lookup_qn_irrep(params,
+                                    lookup_qn, diagram, p_cm, irrep, basis)
+      rows.append(('subduced', diagram, irrep,
+                                          len(qn_irrep[(diagram, irrep)]), 0))
+
+  for correlator in wick.set_lookup_correlators(diagrams):
+    for irrep in irreps:
+      # the contracted correlator has the union of the operators of all
+      # diagrams contributing to it
+      index = pd.concat([qn_irrep[(d, irrep)][lookup_index].astype(str) \
+                        for d in diagrams if d.startswith(correlator)])
+      rows.append(('contracted', correlator, irrep,
+                                          len(index.drop_duplicates()), 0))
+      rows.append(('averaged', correlator, irrep,
+                 len(index[['gevp_row', 'gevp_col']].drop_duplicates()), 0))
+  return rows
+
+def plan(params):
+  """
+  Expected sizes of all stages
+
+  Parameters
+  ----------
+  params : dict
+      Parameters as returned by infile_handler.read_parameters()
+
+  Returns
+  -------
+  pd.DataFrame
+      Table with p_cm, stage, diagram or correlator and irrep as rows. The
+      columns contain the number of operators, the bytes per configuration,
+      the size in memory and on disk in MB and the number of files and
+      datasets read from the output of the contraction code
+
+  Notes
+  -----
+  The number of operators of the contracted data is the number of distinct
+  operators of the contributing diagrams. The hdf5 files are assumed to have
+  the size of the data in memory. In blocked mode only one block of all stages
+  but the averaged data is in memory, see blocked.py
+  """
+
+  nb_cnfg = len(raw_data.set_lookup_cnfg(params['sta_cnfg'],
+        params['end_cnfg'], params['del_cnfg'], params['missing_configs'], 0,
+        params['nb_preview'], params['preview_selection'],
+                                                        shard=params['shard']))
+  # configurations in memory at once
+  nb_cnfg_block = min(nb_cnfg, params['cnfg_block']) \
+                                       if params['cnfg_block'] > 0 else nb_cnfg
+  T = params['T']
+  nb_T = T//2+1 if params['fold'] else T
+
+  index, table = [], []
+  for p_cm in params['p_cm']:
+    for stage, name, irrep, nb_op, nb_in in _rows(params, p_cm):
+      nbytes = nb_op * nb_T * lookup_bytes[stage]
+      index.append((p_cm, stage, name, irrep))
+      in_memory = nb_cnfg if stage == 'averaged' else nb_cnfg_block
+      table.append([nb_op, nbytes, nbytes*in_memory / 1024.**2,
+                    nbytes*nb_cnfg / 1024.**2,
+                    nb_cnfg if nb_in else 0, nb_cnfg*nb_op if nb_in else 0,
+                    nb_cnfg*nb_op*T*16*nb_in / 1024.**2])
+
+  return DataFrame(table, index=pd.MultiIndex.from_tuples(index,
+                                  names=['p_cm', 'stage', 'name', 'irrep']),
+                   columns=['operators', 'bytes/cnfg', 'memory [MB]',
+                            'file [MB]', 'files read', 'datasets read',
+                            'read [MB]'])
+
+def report(params):
+  """
+  Print the plan of the run described by `params`
+  """
+
+  table = plan(params)
+
+  pd.set_option('display.width', 160)
+  pd.set_option('display.max_columns', len(table.columns)+1)
+  pd.set_option('display.max_rows', len(table)+1)
+  print table
+
+  totals = table.groupby(level=['p_cm', 'stage'], sort=False).sum()
+  print '\ntotal per frame and stage'
+  print totals[['operators', 'memory [MB]', 'file [MB]', 'files read',
+                                             'datasets read', 'read [MB]']]
+
+  # without streaming analyse holds all stages of one frame at the same time
+  memory = table['memory [MB]'].groupby(level='p_cm').sum()
+  print '\nlargest frame in memory: p_cm = %d with %.1f MB' % (
+                                                 memory.idxmax(), memory.max())
+  print 'written to disk: %.1f MB' % table['file [MB]'].sum()
+  print 'read from the contraction code: %.1f MB in %d files' % (
+                           table['read [MB]'].sum(), table['files read'].sum())
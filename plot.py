@@ -1,20 +1,66 @@
 import matplotlib
 #matplotlib.use('QT4Agg')
-import matplotlib.pyplot as plt
+import matplotlib.colors
+import matplotlib.font_manager
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.backends.backend_pdf import PdfPages
 
+import multiprocessing
+
 import numpy as np
 import pandas as pd
 from pandas import Series, DataFrame
 
+import resampling
+import selection
 import utils
 
 # TODO: Symmetrization and Antisymmetrization. Take negative eigenvalues under 
 # time reversal into account
-# TODO: this does not work if I work with the column indices directly rather 
-# than the config numbers. Using np.random.randint and iloc should be 
-# considerably faster
-def bootstrap(df, bootstrapsize):
+def resample(df, bootstrapsize, method='bootstrap', block_size=1, seed=1227):
+  """
+  Resampled means over gauge configurations for every row of a table
+
+  Parameters
+  ----------
+  df : pd.DataFrame
+      Lattice data with arbitrary rows and columns cnfg x T. May be complex
+  bootstrapsize : int
+      The number of bootstrap samles being drawn from `df`
+  method : string, {'bootstrap', 'jackknife'}, optional
+      The resampling method
+  block_size : int, optional
+      Number of consecutive configurations resampled together. See 
+      resampling.resample()
+  seed : int, optional
+      Seed of the random streams. See resampling.bootstrap_indices()
+
+  Returns
+  -------
+  pd.DataFrame
+      Lattice data with rows like `df` and columns sample x T. Sample 0 
+      contains the mean over all configurations.
+
+  Notes
+  -----
+  The resampling is linear. Sums and averages over rows as well as real and
+  imaginary part of the returned samples equal the samples of the summed,
+  averaged or real data. The samples can thus be calculated once and shared by
+  all plots of the same data.
+  """
+
+  data = utils.pd_dataframe_to_np_array(df)
+  samples = resampling.resample(np.swapaxes(data, 0, 1), method, bootstrapsize, 
+                                                 seed, block_size=block_size)
+  T = np.sort(df.columns.get_level_values(1).unique())
+
+  columns = pd.MultiIndex.from_product([range(len(samples)), T])
+  return DataFrame(np.swapaxes(samples, 0, 1).reshape((len(df.index), -1)), 
+                                               index=df.index, columns=columns)
+
+def bootstrap(df, bootstrapsize, seed=1227):
   """
   Apply the bootstrap method to randomly resample gauge configurations
 
@@ -24,6 +70,8 @@ def bootstrap(df, bootstrapsize):
       Lattice data with arbitrary rows and columns cnfg x T.
   bootstrapsize : int
       The number of bootstrap samles being drawn from `df`
+  seed : int, optional
+      Seed of the random streams. See resampling.bootstrap_indices()
 
   Returns
   -------
@@ -32,22 +80,38 @@ def bootstrap(df, bootstrapsize):
       level0 column entries is `bootstrapsize` and it contains the mean of
       nb_cnfg randomly drawn configurations.
   """
-  np.random.seed(1227)
-  idx = pd.IndexSlice
 
-  # list of all configuration numbers
-  cnfgs = df.columns.levels[0].values
-  rnd_samples = np.array([np.random.choice(cnfgs, len(cnfgs)*bootstrapsize)]).\
-                                            reshape((bootstrapsize, len(cnfgs)))
-  # writing the mean value in the first sample
-  rnd_samples[0] = cnfgs
+  return resample(df, bootstrapsize, 'bootstrap', seed=seed)
+
+def samples_mean_and_std(samples, method='bootstrap'):
+  """
+  Mean and standard deviation of resampled data
+
+  Parameters
+  ----------
+  samples : pd.DataFrame
+      Table with purely real entries and columns sample x T as returned by 
+      resample()
+  method : string, {'bootstrap', 'jackknife'}, optional
+      The method `samples` were created with
 
-  # Also I have to use a list comprehension rather than rnd directly...
-  boot =  pd.concat([df.loc[:,idx[[r for r in rnd]]].mean(axis=1, level=1) for rnd in rnd_samples], axis=1, keys=range(bootstrapsize))
+  Returns:
+  --------
+  pd.DataFrame
+      Table with identical indices as `samples`. The column level 0 is 
+      replaced by mean and std while level 1 remains unchanged
+  """
+
+  values = np.swapaxes(utils.pd_dataframe_to_np_array(samples), 0, 1)
+  T = np.sort(samples.columns.get_level_values(1).unique())
 
-  return boot
+  mean = DataFrame(values[0], index=samples.index, columns=T)
+  std = DataFrame(resampling.error(values, method), index=samples.index, 
+                                                                    columns=T)
 
-def mean_and_std(df, bootstrapsize):
+  return pd.concat([mean, std], axis=1, keys=['mean', 'std'])
+
+def mean_and_std(df, bootstrapsize, method='bootstrap', block_size=1):
   """
   Mean and standard deviation over all configurations/bootstrap samples
 
@@ -59,6 +123,11 @@ def mean_and_std(df, bootstrapsize):
       is the lattice time
   bootstrapsize : int
       The number of bootstrap samles being drawn from `df`
+  method : string, {'bootstrap', 'jackknife'}, optional
+      The resampling method
+  block_size : int, optional
+      Number of consecutive configurations resampled together. See 
+      resampling.resample()
 
   Returns:
   --------
@@ -72,60 +141,314 @@ def mean_and_std(df, bootstrapsize):
   breaks pandas.
   """
 
-  boot = bootstrap(df, bootstrapsize)
-  mean = boot[0]
-  std = boot.std(axis=1, level=1)
+  return samples_mean_and_std(resample(df, bootstrapsize, method, block_size),
+                                                                        method)
 
-  return pd.concat([mean, std], axis=1, keys=['mean', 'std'])
+################################################################################
+# Pages are described by small dictionaries with the title, axis labels and the
+# mean and std of every graph. They can be sent to worker processes and are
+# rendered there into figure objects independent of the pyplot state.
 
-def plot_gevp_el(data, label_template):
+symbol = ['v', '^', '<', '>', 's', 'p', '*', 'h', 'H', 'D', 'd', '8']
+
+def gevp_el_graphs(data, label_template):
   """
-  Plot all rows of given pd.DataFrame into a single page as seperate graphs
+  Describe all rows of given pd.DataFrame as seperate graphs of a single page
 
   data : pd.DataFrame
-      
+
       Table with any quantity as rows and multicolumns where level 0 contains
       {'mean', 'std'} and level 1 contains 'T'
-  
+
   label_template : string
 
       Format string that will be used to label the graphs. The format must fit
       the index of `data`
+
+  Returns
+  -------
+  list of dict
+      For every row the label, timeslices, mean, std and plot style
   """
 
-  symbol = ['v', '^', '<', '>', 's', 'p', '*', 'h', 'H', 'D', 'd', '8']
-    
   rows = data.index.values
 
-  # iterrows() returns a tuple (index, series) 
-  # index is a string (the index of data must be strings for this to work). In
-  # data has a MultiIndex, index is a tuple of strings
-  # series contains the mean and std for every timeslice
-  for counter, (index, series) in enumerate(data.iterrows()):
+  # prepare parameters for plot design
+  if len(rows) == 1:
+    cmap_brg=['r']
+  else:
+    cmap_brg = matplotlib.cm.brg(np.asarray(range(len(rows))) * 256/(len(rows)-1))
+  shift = 2./5/len(rows)
+
+  T = np.asarray(data['mean'].columns, dtype=float)
+  mean = data['mean'].values
+  std = data['std'].values
+
+  graphs = []
+  for counter, index in enumerate(rows):
+    graphs.append({'label' : label_template % index,
+                   'T' : T+shift*counter, 'mean' : mean[counter],
+                   'std' : std[counter], 'fmt' : symbol[counter%len(symbol)],
+                   'color' : cmap_brg[counter], 'width' : 0.5})
+  return graphs
+
+def _gevp_el_pages(data, diagram, label_template, logscale, verbose):
+  """
+  One page for every gevp element with a graph for every remaining row
+  """
+
+  pages = []
+  # loop over gevp elements
+  for gevp_el_name, gevp_el in selection.split(data,
+                                        selection.build_index(data), ['gevp']):
+    gevp_el_name = gevp_el_name[1:]
+
+    if verbose:
+      print '\tplotting ', gevp_el_name[0], ' - ', gevp_el_name[1]
+
+    pages.append({
+        'title' : r'Gevp Element ${} - {}$'.format(gevp_el_name[0],
+                                                              gevp_el_name[1]),
+        'ylabel' : r'$%s(t/a)$' % diagram, 'logscale' : logscale,
+        'legend' : True, 'graphs' : gevp_el_graphs(gevp_el, label_template)})
+  return pages
+
+def draw_page(ax, page):
+  """
+  Draw the graphs of one page into the axes `ax`
+  """
+
+  ax.set_title(page['title'])
+  ax.set_xlabel(r'$t/a$', fontsize=12)
+  ax.set_ylabel(page['ylabel'], fontsize=12)
+
+  if page['logscale']:
+    ax.set_yscale('log')
+
+  for g in page['graphs']:
+    ax.errorbar(g['T'], g['mean'], g['std'], fmt=g['fmt'], color=g['color'],
+                label=g['label'], markersize=3, capsize=3,
+                capthick=g['width'], elinewidth=g['width'],
+                                   markeredgecolor=g['color'], linewidth='0.0')
+
+  if page['legend']:
+    ax.legend(numpoints=1, loc='best', fontsize=6)
+
+def render_pages(pdfplot, pages):
+  """
+  Write every page into the multipage pdf `pdfplot`. A private figure is used
+  so that the global pyplot state is not touched
+  """
+
+  fig = Figure()
+  FigureCanvasAgg(fig)
+  for page in pages:
+    draw_page(fig.add_subplot(111), page)
+    pdfplot.savefig(fig)
+    fig.clf()
+
+def render(job):
+  """
+  Create one multipage pdf
+
+  Parameters
+  ----------
+  job : tuple
+      Path, filename and list of pages as returned by the plot functions when
+      called without pdfplot
+  """
+
+  path, filename, pages = job
+  pdfplot = utils.create_pdfplot(path, filename)
+  render_pages(pdfplot, pages)
+  pdfplot.close()
+
+def _init_worker():
+  """
+  Fonts loaded before the fork share their state with the parent process and
+  must be reloaded in every worker
+  """
+
+  get_font = getattr(matplotlib.font_manager, '_get_font', None)
+  if hasattr(get_font, 'cache_clear'):
+    get_font.cache_clear()
+
+def render_all(jobs, processes=1, quick_look=None):
+  """
+  Create independent multipage pdfs in parallel
+
+  Parameters
+  ----------
+  jobs : list of tuple
+      See render()
+  processes : int, optional
+      Number of worker processes. 1 renders everything in this process
+  quick_look : {None, 'pdf', 'png'}, optional
+      None renders the full vector pdfs, 'pdf' uses render_quick() and 'png'
+      writes the pages of every job as a grid with render_grid()
+  """
+
+  function = {None : render, 'pdf' : render_quick, 'png' : render_grid}
+  function = function[quick_look]
+
+  if processes > 1 and len(jobs) > 1:
+    pool = multiprocessing.Pool(processes, _init_worker)
+    try:
+      pool.map(function, jobs)
+    finally:
+      pool.close()
+      pool.join()
+  else:
+    for job in jobs:
+      function(job)
+
+################################################################################
+# Quick look. One set of artists is created and only its data is updated from
+# page to page. Error bars are plain line segments and there is no legend.
+
+def _error_segments(graph):
+  """
+  Start and end point of the error bar at every timeslice
+  """
+
+  T, mean, std = graph['T'], graph['mean'], graph['std']
+  return np.stack([np.stack([T, mean-std], axis=-1),
+                   np.stack([T, mean+std], axis=-1)], axis=1)
+
+def _downsample(graph, max_points):
+  """
+  Take every n-th timeslice such that at most `max_points` remain
+  """
+
+  if max_points is None or len(graph['T']) <= max_points:
+    return graph
+  step = int(np.ceil(len(graph['T']) / float(max_points)))
+  graph = dict(graph)
+  for key in ['T', 'mean', 'std']:
+    graph[key] = graph[key][::step]
+  return graph
+
+def draw_page_quick(ax, page, artists, max_points=None, fontsize=12):
+  """
+  Show a page in `ax` by updating the data of existing artists
 
-    T = series.index.levels[1].values
-    mean = series['mean'].values
-    std = series['std'].values
+  Parameters
+  ----------
+  ax : mpl.axes.Axes
+      The axes the artists belong to
+  page : dict
+      Page as returned by the plot functions called without pdfplot
+  artists : list of tuple
+      Pairs of marker line and error bar collection created by earlier calls.
+      Missing artists are appended, surplus ones are hidden
+  max_points : int, optional
+      Maximal number of timeslices shown per graph
+  """
 
-    # prepare parameters for plot design
-    if len(rows) == 1:
-      cmap_brg=['r']
-    else:
-      cmap_brg = plt.cm.brg(np.asarray(range(len(rows))) * 256/(len(rows)-1))
-    shift = 2./5/len(rows)
+  graphs = [_downsample(g, max_points) for g in page['graphs']]
+
+  while len(artists) < len(graphs):
+    line, = ax.plot([], [], linestyle='None', markersize=3)
+    bars = ax.add_collection(LineCollection([], linewidths=0.5))
+    artists.append((line, bars))
+
+  for counter, (line, bars) in enumerate(artists):
+    visible = counter < len(graphs)
+    line.set_visible(visible)
+    bars.set_visible(visible)
+    if not visible:
+      continue
+    g = graphs[counter]
+    color = matplotlib.colors.to_rgba(g['color'])
+    line.set_data(g['T'], g['mean'])
+    line.set_marker(g['fmt'])
+    line.set_color(color)
+    line.set_markeredgecolor(color)
+    bars.set_segments(_error_segments(g))
+    bars.set_color(color)
+
+  ax.set_title(page['title'], fontsize=fontsize)
+  ax.set_ylabel(page['ylabel'], fontsize=fontsize)
+  ax.set_yscale('log' if page['logscale'] else 'linear')
+
+  # limits are set by hand as autoscaling ignores the error bar collections
+  if len(graphs) > 0:
+    T = np.concatenate([g['T'] for g in graphs])
+    low = np.concatenate([g['mean']-g['std'] for g in graphs])
+    high = np.concatenate([g['mean']+g['std'] for g in graphs])
+    if page['logscale']:
+      low = low[low > 0]
+      high = high[high > 0]
+    low, high = low[np.isfinite(low)], high[np.isfinite(high)]
+    if len(T) > 0:
+      ax.set_xlim(T.min()-0.5, T.max()+0.5)
+    if len(low) > 0 and len(high) > 0 and low.min() < high.max():
+      ax.set_ylim(low.min(), high.max())
+
+def render_pages_quick(pdfplot, pages):
+  """
+  Write every page into the multipage pdf `pdfplot` reusing one figure with
+  the same artists for all pages
+  """
 
-    label = label_template % index
+  fig = Figure()
+  FigureCanvasAgg(fig)
+  ax = fig.add_subplot(111)
+  ax.set_xlabel(r'$t/a$', fontsize=12)
 
-    # plot
-    plt.errorbar(T+shift*counter, mean, std, 
-                     fmt=symbol[counter%len(symbol)], color=cmap_brg[counter], \
-                     label=label, markersize=3, capsize=3, capthick=0.5, \
-                     elinewidth=0.5, markeredgecolor=cmap_brg[counter], \
-                                                                linewidth='0.0')
+  artists = []
+  for page in pages:
+    draw_page_quick(ax, page, artists)
+    pdfplot.savefig(fig)
 
+def render_quick(job):
+  """
+  Like render() but with render_pages_quick()
+  """
+
+  path, filename, pages = job
+  pdfplot = utils.create_pdfplot(path, filename)
+  render_pages_quick(pdfplot, pages)
+  pdfplot.close()
+
+def render_grid(job, columns=6, max_points=24, dpi=60):
+  """
+  Write all pages as small panels of a single png
+
+  Parameters
+  ----------
+  job : tuple
+      Path, filename and list of pages. See render()
+  columns : int, optional
+      Number of panels per line
+  max_points : int, optional
+      Maximal number of timeslices shown per graph
+  dpi : int, optional
+      Resolution of the png
+  """
+
+  path, filename, pages = job
+  if len(pages) == 0:
+    return
+
+  columns = min(columns, len(pages))
+  rows = int(np.ceil(len(pages) / float(columns)))
+
+  fig = Figure(figsize=(2.5*columns, 2.*rows))
+  FigureCanvasAgg(fig)
+  for counter, page in enumerate(pages):
+    ax = fig.add_subplot(rows, columns, counter+1)
+    ax.tick_params(labelsize=5)
+    draw_page_quick(ax, page, [], max_points, fontsize=6)
+  fig.tight_layout()
+
+  utils.ensure_dir(path)
+  fig.savefig(path+filename, dpi=dpi)
+
+################################################################################
 
 def avg_row_sum_mom(gevp_data, bootstrapsize, pdfplot, logscale=False, \
-                                                                 verbose=False):
+             verbose=False, method='bootstrap', block_size=1, samples=None):
   """
   Create a multipage plot with a page for every element of the rho gevp
 
@@ -142,9 +465,22 @@ def avg_row_sum_mom(gevp_data, bootstrapsize, pdfplot, logscale=False, \
 
       The number of bootstrap samples being drawn from `gevp_data`.
 
-  pdfplot : mpl.PdfPages object
+  pdfplot : mpl.PdfPages object or None
       
-      Plots will be written to the path `pdfplot` was created with.
+      Plots will be written to the path `pdfplot` was created with. If None,
+      the pages are returned instead to be rendered with render_all()
+
+  method : string, {'bootstrap', 'jackknife'}, optional
+
+      The resampling method for the statistical errors.
+
+  block_size : int, optional
+
+      Number of consecutive configurations resampled together.
+
+  samples : pd.DataFrame, optional
+
+      Resampled `gevp_data` as returned by resample(). Calculated if not given
 
   See also
   --------
@@ -152,76 +488,56 @@ def avg_row_sum_mom(gevp_data, bootstrapsize, pdfplot, logscale=False, \
   utils.create_pdfplot()
   """
 
-  gevp_data = mean_and_std(gevp_data, bootstrapsize)
+  if samples is None:
+    samples = resample(gevp_data, bootstrapsize, method, block_size)
+  gevp_data = samples_mean_and_std(samples, method)
 
+  pages = []
   for gevp_el_name, gevp_el_data in gevp_data.iterrows():
 
     if verbose:
       print '\tplotting ', gevp_el_name[0], ' - ', gevp_el_name[1]
 
-    # prepare data to plot
-    T = gevp_el_data.index.levels[1].astype(int)
-    mean = gevp_el_data['mean'].values
-    std = gevp_el_data['std'].values
-
-    # prepare parameters for plot design
-    plt.title(r'Gevp Element ${} - {}$'.format(gevp_el_name[0], gevp_el_name[1]))
-    plt.xlabel(r'$t/a$', fontsize=12)
-    plt.ylabel(r'$C(t/a)$', fontsize=12)
+    pages.append({
+        'title' : r'Gevp Element ${} - {}$'.format(gevp_el_name[0],
+                                                              gevp_el_name[1]),
+        'ylabel' : r'$C(t/a)$', 'logscale' : logscale, 'legend' : False,
+        'graphs' : [{'label' : None,
+                     'T' : np.asarray(gevp_el_data['mean'].index, dtype=int),
+                     'mean' : gevp_el_data['mean'].values,
+                     'std' : gevp_el_data['std'].values,
+                     'fmt' : 'o', 'color' : 'black', 'width' : 0.75}]})
 
-    if logscale:
-      plt.yscale('log')
-
-    # plot
-    plt.errorbar(T, mean, std, fmt='o', color='black', markersize=3, \
-                 capsize=3, capthick=0.75, elinewidth=0.75, \
-                                       markeredgecolor='black', linewidth='0.0')
-
-    pdfplot.savefig()
-    plt.clf()
-
-  return 
+  if pdfplot is None:
+    return pages
+  render_pages(pdfplot, pages)
 
 # does not make sence for CMF C2 because there i just one momentum
 def sep_rows_sep_mom(data, diagram, bootstrapsize, pdfplot, logscale=False, \
-                                                                 verbose=False):
+             verbose=False, index=None, method='bootstrap', block_size=1, 
+                                                                 samples=None):
 #  # discard imaginary part (noise)
 #  data = data.apply(np.real)
+  if index is None:
+    index = selection.build_index(data)
+  if samples is None:
+    samples = resample(data, bootstrapsize, method, block_size)
   # sum over all gamma structures to get the full Dirac operator transforming 
   # like a row of the desired irrep
-  data = data.sum(level=[0,1,2,3,5])
+  samples = selection.group_reduce(samples, index, ['gevp', 'row', 'momentum'])
 
-  data = mean_and_std(data, bootstrapsize)
+  data = samples_mean_and_std(samples, method)
 
-  # create list of gevp elements to loop over
-  gevp_index = list(set([(g[0],g[1]) for g in data.index.values]))
-  for gevp_el_name in gevp_index:
-
-    if verbose:
-      print '\tplotting ', gevp_el_name[0], ' - ', gevp_el_name[1]
-
-    # prepare plot
-    plt.title(r'Gevp Element ${} - {}$'.format(gevp_el_name[0], gevp_el_name[1]))
-    plt.xlabel(r'$t/a$', fontsize=12)
-    plt.ylabel(r'$%s(t/a)$' % diagram, fontsize=12)
-
-    if logscale:
-      plt.yscale('log')
-
-    # prepare data to plot
-    gevp_el = data.xs(gevp_el_name, level=[0,1])
-
-    # plot
-    plot_gevp_el(gevp_el, r'$\mu = %i, p_{so} = %s - p_{si} = %s$')
-
-    # clean up for next plot
-    plt.legend(numpoints=1, loc='best', fontsize=6)
-    pdfplot.savefig()
-    plt.clf()
+  pages = _gevp_el_pages(data, diagram, r'$\mu = %i, p_{so} = %s - p_{si} = %s$', 
+                                                             logscale, verbose)
+  if pdfplot is None:
+    return pages
+  render_pages(pdfplot, pages)
 
 
 def sep_rows_sum_mom(data, diagram, bootstrapsize, pdfplot, logscale=False, \
-                                                                 verbose=False):
+             verbose=False, index=None, method='bootstrap', block_size=1, 
+                                                                 samples=None):
   """
   Create a multipage plot with a page for every element of the rho gevp. Each
   page contains one graph for each row of the irrep, summed over all momenta.
@@ -245,54 +561,57 @@ def sep_rows_sum_mom(data, diagram, bootstrapsize, pdfplot, logscale=False, \
 
       The number of bootstrap samples being drawn from `gevp_data`.
 
-  pdfplot : mpl.PdfPages object
+  pdfplot : mpl.PdfPages object or None
       
-      Plots will be written to the path `pdfplot` was created with.
+      Plots will be written to the path `pdfplot` was created with. If None,
+      the pages are returned instead to be rendered with render_all()
 
-  See also
-  --------
+  index : dict, optional
 
-  utils.create_pdfplot()
-  """
+      Precomputed selection index of `data` as returned by 
+      selection.build_index()
 
-  # discard imaginary part (noise)
-  data = data.apply(np.real)
-  # sum over all gamma structures to get the full Dirac operator transforming 
-  # like a row of the desired irrep
-  data = data.sum(level=[0,1,2,3,5])
-  # sum over equivalent momenta
-  data = data.sum(level=[0,1,2])
+  method : string, {'bootstrap', 'jackknife'}, optional
 
-  data = mean_and_std(data, bootstrapsize)
+      The resampling method for the statistical errors.
 
-  # create list of gevp elements to loop over
-  gevp_index = list(set([(g[0],g[1]) for g in data.index.values]))
-  for gevp_el_name in gevp_index:
+  block_size : int, optional
 
-    if verbose:
-      print '\tplotting ', gevp_el_name[0], ' - ', gevp_el_name[1]
+      Number of consecutive configurations resampled together.
 
-    # prepare plot
-    plt.title(r'Gevp Element ${} - {}$'.format(gevp_el_name[0], gevp_el_name[1]))
-    plt.xlabel(r'$t/a$', fontsize=12)
-    plt.ylabel(r'$%s(t/a)$' % diagram, fontsize=12)
+  samples : pd.DataFrame, optional
 
-    if logscale:
-      plt.yscale('log')
+      Resampled `data` with identical rows as returned by resample(). The
+      reductions of the plot are applied to the samples instead of 
+      resampling again. Calculated if not given
 
-    # prepare data to plot
-    gevp_el = data.xs(gevp_el_name, level=[0,1])
+  See also
+  --------
 
-    # plot
-    plot_gevp_el(gevp_el, r'$\mu = %i$')
+  utils.create_pdfplot()
+  """
 
-    # clean up for next plot
-    plt.legend(numpoints=1, loc='best', fontsize=6)
-    pdfplot.savefig()
-    plt.clf()
+  if index is None:
+    index = selection.build_index(data)
+  if samples is None:
+    samples = resample(data, bootstrapsize, method, block_size)
+  # discard imaginary part (noise)
+  samples = samples.apply(np.real)
+  # sum over all gamma structures to get the full Dirac operator transforming 
+  # like a row of the desired irrep and sum over equivalent momenta
+  samples = selection.group_reduce(samples, index, ['gevp', 'row'])
+
+  data = samples_mean_and_std(samples, method)
+
+  pages = _gevp_el_pages(data, diagram, r'$\mu = %i$', 
+                                                             logscale, verbose)
+  if pdfplot is None:
+    return pages
+  render_pages(pdfplot, pages)
 
 def avg_rows_sep_mom(data, diagram, bootstrapsize, pdfplot, logscale=False, \
-                                                                 verbose=False):
+             verbose=False, index=None, method='bootstrap', block_size=1, 
+                                                                 samples=None):
   """
   Create a multipage plot with a page for every element of the rho gevp. Each
   page contains one graph for each momentum, averaged over all rows of the 
@@ -317,9 +636,29 @@ def avg_rows_sep_mom(data, diagram, bootstrapsize, pdfplot, logscale=False, \
 
       The number of bootstrap samples being drawn from `gevp_data`.
 
-  pdfplot : mpl.PdfPages object
+  pdfplot : mpl.PdfPages object or None
       
-      Plots will be written to the path `pdfplot` was created with.
+      Plots will be written to the path `pdfplot` was created with. If None,
+      the pages are returned instead to be rendered with render_all()
+
+  index : dict, optional
+
+      Precomputed selection index of `data` as returned by 
+      selection.build_index()
+
+  method : string, {'bootstrap', 'jackknife'}, optional
+
+      The resampling method for the statistical errors.
+
+  block_size : int, optional
+
+      Number of consecutive configurations resampled together.
+
+  samples : pd.DataFrame, optional
+
+      Resampled `data` with identical rows as returned by resample(). The
+      reductions of the plot are applied to the samples instead of 
+      resampling again. Calculated if not given
 
   See also
   --------
@@ -327,78 +666,23 @@ def avg_rows_sep_mom(data, diagram, bootstrapsize, pdfplot, logscale=False, \
   utils.create_pdfplot()
   """
 
+  if index is None:
+    index = selection.build_index(data)
+  if samples is None:
+    samples = resample(data, bootstrapsize, method, block_size)
   # discard imaginary part (noise)
-  data = data.apply(np.real)
+  samples = samples.apply(np.real)
   # sum over all gamma structures to get the full Dirac operator transforming 
   # like a row of the desired irrep
-  data = data.sum(level=[0,1,2,3,5])
+  samples = selection.group_reduce(samples, index, ['gevp', 'row', 'momentum'])
   # average over rows
-  data = data.mean(level=[0,1,3,4])
+  samples = selection.group_reduce(samples, selection.build_index(samples), 
+                                                  ['gevp', 'momentum'], 'mean')
  
-  data = mean_and_std(data, bootstrapsize)
-
-  gevp_index = list(set([(g[0],g[1]) for g in data.index.values]))
-  for gevp_el_name in gevp_index:
-
-    if verbose:
-      print 'plotting ', gevp_el_name[0], ' - ', gevp_el_name[1]
-
-    # prepare plot
-    plt.title(r'Gevp Element ${} - {}$'.format(gevp_el_name[0], gevp_el_name[1]))
-    plt.xlabel(r'$t/a$', fontsize=12)
-    plt.ylabel(r'$%s(t/a)$' % diagram, fontsize=12)
-
-    if logscale:
-      plt.yscale('log')
-
-    # prepare data to plot
-    gevp_el = data.xs(gevp_el_name, level=[0,1])
-
-    # plot
-    plot_gevp_el(gevp_el, r'$p_{so} = %s - p_{si} = %s$')
-
-    # clean up for next plot
-    plt.legend(numpoints=1, loc='best', fontsize=6)
-    pdfplot.savefig()
-    plt.clf()
-
-def quick_view(data, bootstrapsize, pdfplot, logscale=False, \
-                                                                 verbose=False):
-  # TODO: pass data as list
-  # calculate mean and std for every list member
-  # concat along columns with identifier A1 and E2
-  # can do that clean with merge but just a quick and dirty version vor new
-  # copy paste plt command in loop to plot next to eahc other
-  # normalize to timelice something. 7 or so.
-  data = mean_and_std(data, bootstrapsize)
-
-  for gevp_el_name, gevp_el_data in data.iterrows():
-
-    if verbose:
-      print '\tplotting ', gevp_el_name[0], ' - ', gevp_el_name[1]
-
-    # prepare data to plot
-    T = gevp_el_data.index.levels[1].astype(int)
-    mean = gevp_el_data['mean'].values
-    std = gevp_el_data['std'].values
-
-    A1 = (df4.ix[3]/df4.iloc[3,7]).mean(level=1)
-    # prepare parameters for plot design
-    plt.title(r'Gevp Element ${} - {}$'.format(gevp_el_name[0], gevp_el_name[1]))
-    plt.xlabel(r'$t/a$', fontsize=12)
-    plt.ylabel(r'$C(t/a)$', fontsize=12)
-
-    if logscale:
-      plt.yscale('log')
-
-    # plot
-    plt.errorbar(T, mean, std, fmt='o', color='black', markersize=3, \
-                 capsize=3, capthick=0.75, elinewidth=0.75, \
-                                       markeredgecolor='black', linewidth='0.0')
-
-    pdfplot.savefig()
-    plt.clf()
-
-  return 
-
+  data = samples_mean_and_std(samples, method)
 
+  pages = _gevp_el_pages(data, diagram, r'$p_{so} = %s - p_{si} = %s$', 
+                                                             logscale, verbose)
+  if pdfplot is None:
+    return pages
+  render_pages(pdfplot, pages)
@@ -14,8 +14,81 @@ def _scalar_mul(x, y):
 def _abs2(x):
   return _scalar_mul(x, x)
 
+# behaviour of the Dirac structures under time reversal, referenced by their id
+# in the cntrv0.1-code. gamma_0gamma_i flips the sign, gamma_5gamma_0gamma_i is
+# proportional to sigma_jk and keeps the sign of gamma_i.
+lookup_parity = {1 : 1, 2 : 1, 3 : 1, 5 : 1, 
+                 10 : -1, 11 : -1, 12 : -1, 13 : 1, 14 : 1, 15 : 1}
+
+# additional sign under time reversal for every diagram
+lookup_diagram_parity = {'C20' : 1, 'C2+' : 1, 'C3+' : 1, 'C4+B' : 1, 
+                                                      'C4+C' : 1, 'C4+D' : 1}
+
+def _flatten(g):
+  if isinstance(g, (tuple, list)):
+    return [i for x in g for i in _flatten(x)]
+  return [g]
+
+def parity(lookup_qn, diagram):
+  """
+  Sign of every operator under time reversal C(T-t) = \pm C(t)
+
+  Parameters
+  ----------
+  lookup_qn : pd.DataFrame
+      Quantum numbers as returned by set_lookup_qn()
+  diagram : string
+      The diagram `lookup_qn` belongs to
+
+  Returns
+  -------
+  pd.Series
+      +1 or -1 for every row of `lookup_qn`. The product of the parities of all
+      Dirac structures at source and sink and of the diagram
+  """
+
+  sign = lookup_diagram_parity.get(diagram, 1)
+  return lookup_qn.apply(lambda qn: sign * np.prod([lookup_parity[g] \
+           for g in _flatten([qn['\gamma_{so}'], qn['\gamma_{si}']])]), axis=1)
+
+def fold_data(data, lookup_qn, diagram, T):
+  """
+  Average correlators with their time reversed partners
+
+  Parameters
+  ----------
+  data : pd.DataFrame
+      Raw data with rows cnfg x T and the rows of `lookup_qn` as columns
+  lookup_qn : pd.DataFrame
+      Quantum numbers of the columns of `data`
+  diagram : string
+      The diagram of `data`
+  T : int
+      Time extent of the lattice
+
+  Returns
+  -------
+  pd.DataFrame
+      Like `data` but only with the T/2+1 timeslices 
+      C(t) = (C(t) \pm C(T-t))/2 for t = 0, ..., T/2
+  """
+
+  nb_T = T//2+1
+  cnfgs = data.index.get_level_values(0).unique()
+  p = parity(lookup_qn, diagram).loc[data.columns].values
+
+  values = np.asarray(data.values).reshape((len(cnfgs), T, -1))
+  reverse = values[:,(-np.arange(nb_T))%T]
+  folded = 0.5*(values[:,:nb_T] + p*reverse)
+
+  index = pd.MultiIndex.from_product([cnfgs, range(nb_T)], 
+                                                         names=['cnfg', 'T'])
+  return DataFrame(folded.reshape((-1, values.shape[-1])), index=index, 
+                                                         columns=data.columns)
+
 # TODO: nb_cnfg is spurious, can just use len(lookup_cnfg)
-def set_lookup_cnfg(sta_cnfg, end_cnfg, del_cnfg, missing_configs, verbose=0):
+def set_lookup_cnfg(sta_cnfg, end_cnfg, del_cnfg, missing_configs, verbose=0,
+            nb_preview=0, preview_selection='strided', seed=1227, shard=None):
   """
   Get a list of all gauge configurations contractions where performed on
 
@@ -30,6 +103,16 @@ def set_lookup_cnfg(sta_cnfg, end_cnfg, del_cnfg, missing_configs, verbose=0):
   missing_configs : list of int
       List of configurations to be omitted because the contractions were not
       performed
+  nb_preview : int, optional
+      If larger than 0 only a subset of that many configurations is returned
+      to quickly preview the analysis
+  preview_selection : string, {'strided', 'random'}, optional
+      Take the subset evenly spaced over the Monte Carlo history or drawn at
+      random. The random subset is reproducible for a given `seed`
+  shard : tuple of int, optional
+      Index and number of shards. Only the contiguous part of the 
+      configurations with that index is returned when splitting them into that
+      many parts of nearly equal size
 
   Returns
   -------
@@ -44,6 +127,24 @@ def set_lookup_cnfg(sta_cnfg, end_cnfg, del_cnfg, missing_configs, verbose=0):
     if cnfg in missing_configs:
       continue
     lookup_cnfg.append(cnfg)
+
+  if 0 < nb_preview < len(lookup_cnfg):
+    if preview_selection == 'random':
+      subset = np.random.RandomState(seed).choice(len(lookup_cnfg), nb_preview,
+                                                                 replace=False)
+    elif preview_selection == 'strided':
+      subset = np.linspace(0, len(lookup_cnfg)-1, nb_preview).astype(int)
+    else:
+      raise ValueError('in set_lookup_cnfg: preview selection %s unknown' % \
+                                                             preview_selection)
+    # keep the order of the Monte Carlo history
+    lookup_cnfg = [lookup_cnfg[i] for i in np.sort(subset)]
+
+  if shard is not None:
+    index, nb_shards = shard
+    lookup_cnfg = np.array_split(np.asarray(lookup_cnfg), nb_shards)[index]
+    lookup_cnfg = [int(cnfg) for cnfg in lookup_cnfg]
+
   if(verbose):
     print '\t\tNumber of configurations: %i' % len(lookup_cnfg)
 
@@ -328,7 +429,8 @@ def multiply_trtr_diagram(data):
 ################################################################################
 # reading configurations
 
-def read(lookup_cnfg, lookup_qn, diagram, T, directory, verbose=0):
+def read(lookup_cnfg, lookup_qn, diagram, T, directory, verbose=0, 
+                                                                   fold=False):
   """
   Read resulting correlators from contraction code and creates a pd.DataFrame
 
@@ -345,6 +447,9 @@ def read(lookup_cnfg, lookup_qn, diagram, T, directory, verbose=0):
       Time extent of the lattice
   directory : string
       Output path of contraction code
+  fold : bool, optional
+      Symmetrize or antisymmetrize under time reversal and keep only the 
+      timeslices 0, ..., T/2. See fold_data()
 
   Returns
   -------
@@ -402,12 +507,17 @@ def read(lookup_cnfg, lookup_qn, diagram, T, directory, verbose=0):
     data.append(data_qn)
   data = pd.concat(data, keys=lookup_cnfg, axis=0, names=['cnfg', 'T'])
 
+  data = data.sort_index(level=[0,1])
+  if fold:
+    data = fold_data(data, lookup_qn, diagram, T)
+
   if verbose:
     print '\tfinished reading'
 
-  return data.sort_index(level=[0,1])
+  return data
 
-def read_old(lookup_cnfg, lookup_qn, diagram, T, directory, verbose=0):
+def read_old(lookup_cnfg, lookup_qn, diagram, T, directory, verbose=0,
+                                                                   fold=False):
   """
   Read resulting correlators from contraction code and creates a pd.DataFrame
 
@@ -424,6 +534,9 @@ def read_old(lookup_cnfg, lookup_qn, diagram, T, directory, verbose=0):
       Time extent of the lattice
   directory : string
       Output path of contraction code
+  fold : bool, optional
+      Symmetrize or antisymmetrize under time reversal and keep only the 
+      timeslices 0, ..., T/2. See fold_data()
 
   Returns
   -------
@@ -479,10 +592,14 @@ def read_old(lookup_cnfg, lookup_qn, diagram, T, directory, verbose=0):
   # generate data frame containing all operators for all configs
   data = pd.concat(data, keys=lookup_cnfg, axis=0, names=['cnfg', 'T'])
 
+  data = data.sort_index(level=[0,1])
+  if fold:
+    data = fold_data(data, lookup_qn, diagram, T)
+
   if verbose:
     print '\tfinished reading'
 
-  return data.sort_index(level=[0,1])
+  return data
   ##############################################################################
 
 
@@ -0,0 +1,182 @@
+# Resampling of lattice data over gauge configurations. All functions work on
+# numpy arrays with the gauge configurations on axis 0 and return arrays with
+# the samples on axis 0, where sample 0 is always the mean over all 
+# configurations
+
+import numpy as np
+
+# count matrices of all bootstrap samples drawn so far
+_counts = {}
+
+def bootstrap_indices(nb_cnfg, samples, seed=1227):
+  """
+  Indices of the gauge configurations drawn for the given bootstrap samples
+
+  Parameters
+  ----------
+  nb_cnfg : int
+      Number of gauge configurations
+  samples : list of int
+      The numbers of the bootstrap samples to draw. Sample 0 is the mean and
+      contains every configuration exactly once
+  seed : int, optional
+      Seed of the resampling. Every sample k draws from its own random stream
+      seeded with (seed, k), so the result for a sample does not depend on
+      which other samples are drawn alongside it. Samples can thus be split
+      among workers and give identical results
+
+  Returns
+  -------
+  np.array
+      Integer array with shape (len(samples), nb_cnfg)
+  """
+
+  idx = np.empty((len(samples), nb_cnfg), dtype=int)
+  for i, k in enumerate(samples):
+    if k == 0:
+      idx[i] = np.arange(nb_cnfg)
+    else:
+      idx[i] = np.random.RandomState([seed, k]).randint(0, nb_cnfg, 
+                                                                 size=nb_cnfg)
+  return idx
+
+def bootstrap_counts(nb_cnfg, samples, seed=1227):
+  """
+  How often every gauge configuration is drawn in the given bootstrap samples
+
+  Parameters
+  ----------
+  See bootstrap_indices()
+
+  Returns
+  -------
+  np.array
+      Integer array with shape (len(samples), nb_cnfg). The means of all 
+      samples are the product of this matrix with the data divided by nb_cnfg.
+      The matrices are cached, so all data of an ensemble is resampled with
+      the same read-only array
+  """
+
+  key = (nb_cnfg, tuple(samples), seed)
+  if key in _counts:
+    return _counts[key]
+
+  idx = bootstrap_indices(nb_cnfg, samples, seed)
+  # one bincount for all samples by offsetting the indices of every sample
+  offset = nb_cnfg*np.arange(len(idx))[:,np.newaxis]
+  counts = np.bincount((idx+offset).ravel(), 
+                     minlength=len(idx)*nb_cnfg).reshape((len(idx), nb_cnfg))
+  counts.flags.writeable = False
+
+  _counts[key] = counts
+  return counts
+
+def block_sums(data, block_size):
+  """
+  Sums over non-overlapping blocks of consecutive gauge configurations
+
+  Parameters
+  ----------
+  data : np.array
+      Array with shape (cnfg, ...)
+  block_size : int
+      Number of consecutive configurations per block. Configurations at the end
+      that do not fill a complete block are dropped
+
+  Returns
+  -------
+  np.array
+      Array with shape (cnfg // block_size, ...)
+
+  Notes
+  -----
+  The block sums are differences of the prefix sums over the configuration 
+  axis, so every block costs O(1) independent of its size
+  """
+
+  nb_blocks = data.shape[0] // block_size
+  prefix = np.concatenate([np.zeros((1,)+data.shape[1:], dtype=data.dtype),
+                                                   np.cumsum(data, axis=0)])
+  bounds = block_size*np.arange(nb_blocks+1)
+  return prefix[bounds[1:]] - prefix[bounds[:-1]]
+
+def resample(data, method, nb_samples, seed=1227, samples=None, block_size=1):
+  """
+  Resampled means of lattice data over gauge configurations
+
+  Parameters
+  ----------
+  data : np.array
+      Array with shape (cnfg, ...)
+  method : string, {'bootstrap', 'jackknife'}
+      The resampling method.
+  nb_samples : int
+      Number of bootstrap samples including the mean. Ignored for the 
+      jackknife
+  seed : int, optional
+      Seed of the bootstrap. See bootstrap_indices()
+  samples : list of int, optional
+      Only calculate the bootstrap samples with these numbers. Defaults to all
+      `nb_samples` samples
+  block_size : int, optional
+      Resample blocks of consecutive configurations to account for 
+      autocorrelation. The jackknife deletes one block per sample, the 
+      bootstrap draws blocks instead of configurations. 1 gives the delete-one
+      jackknife and the naive bootstrap
+
+  Returns
+  -------
+  np.array
+      Array with shape (samples, ...). Sample 0 always is the mean over all
+      configurations
+  """
+
+  nb_cnfg = data.shape[0]
+  mean = data.mean(axis=0)
+  if block_size == 1:
+    blocks = data
+  else:
+    blocks = block_sums(data, block_size)
+  nb_blocks = blocks.shape[0]
+
+  if method == 'jackknife':
+    # the sum over all used configurations minus one block for every sample
+    total = blocks.sum(axis=0)
+    samples = (total - blocks) / float((nb_blocks-1)*block_size)
+    return np.concatenate([mean[np.newaxis], samples])
+  elif method == 'bootstrap':
+    if samples is None:
+      samples = range(nb_samples)
+    # the means of all samples in one product
+    counts = bootstrap_counts(nb_blocks, samples, seed)
+    result = np.tensordot(counts, blocks, axes=(1,0)) / \
+                                                 float(nb_blocks*block_size)
+    # trailing configurations not filling a block only enter the mean
+    result[np.asarray(samples) == 0] = mean
+    return result
+  else:
+    raise ValueError('in resample: method %s unknown' % method)
+
+def error(samples, method):
+  """
+  Statistical error from resampled values
+
+  Parameters
+  ----------
+  samples : np.array
+      Array with shape (samples, ...) where sample 0 is the mean value
+  method : string, {'bootstrap', 'jackknife'}
+      The method `samples` were created with
+
+  Returns
+  -------
+  np.array
+      The standard error with shape `samples.shape[1:]`
+  """
+
+  samples = samples[1:]
+  n = samples.shape[0]
+  if method == 'jackknife':
+    return np.sqrt((n-1.)/n * np.sum(
+                              (samples-samples.mean(axis=0))**2, axis=0))
+  return samples.std(axis=0, ddof=1)
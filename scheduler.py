@@ -0,0 +1,292 @@
+# Run the stages of the analysis as a graph of tasks. A task is a tuple of the
+# stage and the keys of its output, e.g. ('subduce', p_cm, diagram, irrep).
+# Tasks pass their results on through the stage directories of the output path,
+# so every ready task can run in its own worker process.
+
+import multiprocessing
+import resource
+import time
+
+import pipeline
+import wick
+from ensemble import Ensemble
+
+# order of the stages. Ready tasks of later stages are started first so that
+# chains of tasks finish early
+lookup_stages = ['read', 'subduce', 'contract', 'gevp', 'plot']
+
+# outputs of the tasks of every stage. See Ensemble.artifact()
+lookup_outputs = {'read' : ['raw'], 'subduce' : ['subduced'],
+                  'contract' : ['contracted', 'averaged'], 'gevp' : ['gevp'],
+                                                             'plot' : ['plot']}
+
+def build_graph(params):
+  """
+  Tasks of all stages switched on in the infile
+
+  Parameters
+  ----------
+  params : dict
+      Parameters as returned by infile_handler.read_parameters()
+
+  Returns
+  -------
+  dict
+      The tasks each task depends on. Tasks of stages switched off are left
+      out and their output is read from disk
+  """
+
+  diagrams = params['diagrams']
+  correlators = wick.set_lookup_correlators(diagrams)
+
+  graph = {}
+  for p_cm in params['p_cm']:
+    irreps = pipeline.get_lattice_basis(params, p_cm)[1]
+
+    for diagram in diagrams:
+      if params['flag_read']:
+        graph[('read', p_cm, diagram)] = []
+      if params['flag_subduction']:
+        for irrep in irreps:
+          graph[('subduce', p_cm, diagram, irrep)] = [('read', p_cm, diagram)]
+
+    # the automatic block size depends on the averaged data of all irreps
+    contract_all = [('contract', p_cm, c, irrep) for c in correlators \
+                                                           for irrep in irreps]
+    for irrep in irreps:
+      contract = [('contract', p_cm, c, irrep) for c in correlators]
+      if params['auto_block_size']:
+        contract = contract_all
+      if params['flag_contraction']:
+        for correlator in correlators:
+          graph[('contract', p_cm, correlator, irrep)] = \
+                               [('subduce', p_cm, d, irrep) for d in diagrams \
+                                                   if d.startswith(correlator)]
+      if params['flag_gevp']:
+        graph[('gevp', p_cm, irrep)] = contract
+      if params['flag_plot']:
+        graph[('plot', p_cm, irrep)] = contract + [('gevp', p_cm, irrep)]
+
+  return dict((task, [d for d in deps if d in graph]) \
+                                               for task, deps in graph.items())
+
+def work_units(params):
+  """
+  All tasks of build_graph() in a fixed order: by stage, center of mass
+  momentum, diagram or correlator and irrep. The tasks of one stage only
+  depend on tasks with smaller index
+  """
+
+  return sorted(build_graph(params), 
+                   key=lambda task: (lookup_stages.index(task[0]),) + task[1:])
+
+def print_work_units(params):
+  """
+  Print the index, stage, center of mass momentum, diagram or correlator and 
+  irrep of every work unit
+  """
+
+  print '# index stage p_cm [diagram or correlator] [irrep]'
+  for index, task in enumerate(work_units(params)):
+    print index, ' '.join(map(str, task))
+
+def run_work_unit(params, index):
+  """
+  Run the work unit with the given index of work_units(). Its inputs are read
+  from disk and must have been written by the units it depends on
+  """
+
+  params = dict(params, streaming=False)
+  units = work_units(params)
+  if not 0 <= index < len(units):
+    raise IndexError('in run_work_unit: %d work units, got index %d' % \
+                                                            (len(units), index))
+  run_task(params, units[index])
+
+def run_task(params, task, ensemble=None):
+  """
+  Compute the output of `task` and write it to disk. Everything the task
+  depends on is read from disk
+
+  Parameters
+  ----------
+  params : dict
+      Parameters as returned by infile_handler.read_parameters()
+  task : tuple
+      Task of build_graph()
+  ensemble : Ensemble, optional
+      Memoized data shared by all tasks. Data already in memory is neither read
+      nor recomputed, but written again if its file is not current. Only 
+      meaningful with the cache switched on
+  """
+
+  stage, p_cm = task[:2]
+  outputs = lookup_outputs[stage]
+
+  def get_ensemble(**kwargs):
+    if ensemble is not None:
+      return ensemble.view(**kwargs)
+    return Ensemble(params, **kwargs)
+
+  # with the cache the task is skipped if its outputs are up to date
+  if params['cache'] and all(get_ensemble().is_current(output, *task[1:]) \
+                                                         for output in outputs):
+    if params['verbose']:
+      print '\tskipping %s' % ' '.join(map(str, task))
+    return
+
+  if params['verbose']:
+    print '\trunning %s' % ' '.join(map(str, task))
+
+  if stage == 'read':
+    get_ensemble(recompute=outputs).raw(p_cm, task[2])
+
+  elif stage == 'subduce':
+    get_ensemble(recompute=outputs).subduced(*task[1:])
+
+  elif stage == 'contract':
+    ensemble = get_ensemble(recompute=outputs)
+    ensemble.contracted(*task[1:])
+    ensemble.averaged(*task[1:])
+
+  elif stage == 'gevp':
+    ensemble = get_ensemble()
+    params = dict(params, block_size=ensemble.block_size(p_cm))
+    for irreps, gevp_data in ensemble.gevp(*task[1:]):
+      if params['flag_solve']:
+        pipeline.solve_gevp(params, gevp_data,
+                                   'Gevp_p%1i_%s' % (p_cm, '_'.join(irreps)))
+    ensemble.write_digest(stage, *task[1:])
+
+  elif stage == 'plot':
+    import plot
+    irrep = task[2]
+    ensemble = get_ensemble(write=False)
+    params = dict(params, block_size=ensemble.block_size(p_cm))
+    correlators = ensemble.correlators
+    keys = [(c, irrep) for c in correlators]
+    data = dict((k, ensemble.contracted(p_cm, *k)) for k in keys)
+    index = dict((k, ensemble.contracted_index(p_cm, *k)) for k in keys)
+    avg = dict((k, ensemble.averaged(p_cm, *k)) for k in keys) \
+                                                if params['flag_gevp'] else None
+    plot.render_all(pipeline.plot_jobs(params, p_cm, irrep, data, index, avg),
+                                                      1, params['quick_look'])
+    ensemble.write_digest(stage, *task[1:])
+
+def _init_worker(memory_limit):
+  """
+  Limit the address space of the worker process to `memory_limit` MB
+  """
+
+  if memory_limit > 0:
+    limit = memory_limit * 1024**2
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def _ready(graph, done, started):
+  """
+  Tasks not started yet whose dependencies are all done. The keys of `graph`
+  are pairs of the index of the ensemble and the task
+  """
+
+  ready = [key for key, deps in graph.items() \
+                         if key not in started and all(d in done for d in deps)]
+  return sorted(ready, key=lambda (n, task): -lookup_stages.index(task[0]))
+
+def run(params, processes=1, memory_limit=0, ensemble=None):
+  """
+  Run all tasks of build_graph() as soon as their dependencies are done
+
+  Parameters
+  ----------
+  params : dict
+      Parameters as returned by infile_handler.read_parameters()
+  processes : int, optional
+      Number of worker processes
+  memory_limit : int, optional
+      Maximal address space of every worker process in MB. 0 does not limit it.
+      A worker exceeding it fails with a MemoryError which stops the run
+  ensemble : Ensemble, optional
+      Memoized data shared by all tasks run in this process. See run_task()
+
+  Notes
+  -----
+  The tasks exchange their data through the output path. The streaming mode
+  is therefore switched off and every stage is written to disk. If the cache
+  is switched on, tasks whose output is up to date are skipped. See
+  Ensemble.is_current()
+  """
+
+  run_batch([params], processes, memory_limit, [ensemble])
+
+def run_batch(ensembles, processes=1, memory_limit=0, memos=None):
+  """
+  Run the tasks of several ensembles under one scheduler. See run()
+
+  Parameters
+  ----------
+  ensembles : list of dict
+      Parameters of every ensemble as returned by 
+      infile_handler.read_parameters()
+  memos : list of Ensemble, optional
+      Memoized data of every ensemble shared by all of its tasks run in this 
+      process. Entries may be None
+
+  Notes
+  -----
+  The tables not depending on the ensemble, like lattice bases, Clebsch-Gordan
+  coefficients and quantum numbers, are calculated once before the worker 
+  processes are started and shared by all of them. See 
+  pipeline.precompute_tables()
+  """
+
+  ensembles = [dict(params, streaming=False) for params in ensembles]
+
+  # tasks are identified by the index of their ensemble and the task
+  graph = {}
+  for n, params in enumerate(ensembles):
+    for task, deps in build_graph(params).items():
+      graph[(n, task)] = [(n, d) for d in deps]
+  if any(params['verbose'] for params in ensembles):
+    print 'task graph with %d tasks' % len(graph)
+
+  done = set()
+
+  if processes <= 1 and memory_limit <= 0:
+    while len(done) < len(graph):
+      n, task = _ready(graph, done, done)[0]
+      run_task(ensembles[n], task, memos[n] if memos else None)
+      done.add((n, task))
+    return
+
+  for params in ensembles:
+    if params['flag_subduction']:
+      pipeline.precompute_tables(params)
+
+  # every task gets a fresh process. The memory of a task is returned to the
+  # system as soon as it is done
+  pool = multiprocessing.Pool(processes, _init_worker, (memory_limit,),
+                                                            maxtasksperchild=1)
+  running = {}
+  try:
+    while len(done) < len(graph):
+      for n, task in _ready(graph, done, set(running) | done):
+        running[(n, task)] = pool.apply_async(run_task, (ensembles[n], task))
+
+      finished = [key for key, result in running.items() if result.ready()]
+      if len(finished) == 0:
+        time.sleep(0.1)
+        continue
+      for key in finished:
+        try:
+          running.pop(key).get()
+        except Exception:
+          print 'Error! Task %s of %s failed' % (' '.join(map(str, key[1])),
+                                                  ensembles[key[0]]['ensemble'])
+          raise
+        done.add(key)
+    pool.close()
+  except:
+    pool.terminate()
+    raise
+  finally:
+    pool.join()
@@ -0,0 +1,214 @@
+# Precomputed integer index for the tables of subduced and contracted data.
+# Selecting rows by quantum numbers and summing over groups of rows becomes
+# array indexing into the values instead of comparing tuple labels of the
+# MultiIndex over and over.
+
+import numpy as np
+import pandas as pd
+from pandas import Series, DataFrame
+
+# the index levels classifying the rows of subduced and contracted data
+lookup_groups = {
+  'gevp'     : ['Irrep', 'gevp_row', 'gevp_col'],
+  'row'      : ['\mu'],
+  'momentum' : ['p_{so}', 'p_{si}'],
+  'gamma'    : ['\gamma_{so}', '\gamma_{si}'],
+  'mult'     : ['mult_{so}', 'mult_{si}']
+}
+
+def _levels(groups):
+  """
+  Translate a list of group names and level names into a list of level names
+  """
+
+  levels = []
+  for g in groups:
+    levels += lookup_groups.get(g, [g])
+  return levels
+
+def _codes(index):
+  """
+  Integer codes of all levels of a pd.MultiIndex. Renamed from labels to
+  codes in pandas 0.24
+  """
+
+  if hasattr(index, 'codes'):
+    return index.codes
+  return index.labels
+
+def build_index(df):
+  """
+  Precompute integer codes of every row for all levels of the index of `df`
+
+  Parameters
+  ----------
+  df : pd.DataFrame
+      Table with a hierarchical index, e.g. the subduced or contracted data
+      with levels Irrep, gevp_row, gevp_col, \mu, p_{so}, \gamma_{so}, p_{si},
+      \gamma_{si}, mult_{so}, mult_{si}
+
+  Returns
+  -------
+  index : dict
+      'names' : list of the level names
+      'codes' : dict of np.array with the integer code of each row per level
+      'labels' : dict of pd.Index with the label belonging to each code
+      'groups' : dict caching the row grouping for combinations of levels.
+          The groupings by gevp element, by gevp element and row and by
+          gevp element, row and momentum are precomputed
+  """
+
+  mi = df.index
+  if not isinstance(mi, pd.MultiIndex):
+    mi = pd.MultiIndex.from_arrays([mi], names=[mi.name])
+
+  index = {'names' : list(mi.names), 'codes' : {}, 'labels' : {},
+                                                                  'groups' : {}}
+  for name, level, codes in zip(mi.names, mi.levels, _codes(mi)):
+    index['codes'][name] = np.asarray(codes)
+    index['labels'][name] = level
+
+  for groups in [['gevp'], ['gevp', 'row'], ['gevp', 'row', 'momentum']]:
+    if all(l in index['names'] for l in _levels(groups)):
+      grouping(index, groups)
+
+  return index
+
+def grouping(index, groups):
+  """
+  Group the rows by the combinations of labels in the given levels
+
+  Parameters
+  ----------
+  index : dict
+      Precomputed index as returned by build_index()
+  groups : list of string
+      Names of groups in `lookup_groups` or level names
+
+  Returns
+  -------
+  group_id : np.array
+      For every row the number of the group it belongs to
+  keys : pd.MultiIndex
+      The labels of every group
+  """
+
+  levels = _levels(groups)
+  key = tuple(levels)
+  if key in index['groups']:
+    return index['groups'][key]
+
+  codes = np.stack([index['codes'][l] for l in levels])
+  unique, group_id = np.unique(codes, axis=1, return_inverse=True)
+
+  keys = pd.MultiIndex.from_arrays([index['labels'][l].take(u) \
+                                 for l, u in zip(levels, unique)], names=levels)
+
+  index['groups'][key] = (group_id, keys)
+  return group_id, keys
+
+def positions(index, selection):
+  """
+  Integer positions of all rows matching the given labels
+
+  Parameters
+  ----------
+  index : dict
+      Precomputed index as returned by build_index()
+  selection : dict
+      Level names as keys and a label or list of labels as values
+
+  Returns
+  -------
+  np.array
+      The positions of all rows where every given level has one of the given
+      labels
+  """
+
+  mask = np.ones(len(index['codes'][index['names'][0]]), dtype=bool)
+  for level, labels in selection.items():
+    if not isinstance(labels, list):
+      labels = [labels]
+    lookup = index['labels'][level]
+    codes = [lookup.get_loc(l) for l in labels if l in lookup]
+    mask &= np.in1d(index['codes'][level], codes)
+
+  return np.flatnonzero(mask)
+
+def group_reduce(df, index, groups, how='sum'):
+  """
+  Sum or average all rows of `df` that share the labels in the given levels
+
+  Parameters
+  ----------
+  df : pd.DataFrame
+      Table with rows in the order `index` was built for
+  index : dict
+      Precomputed index as returned by build_index()
+  groups : list of string
+      Names of groups in `lookup_groups` or level names to keep
+  how : string, {'sum', 'mean'}
+      Whether to sum or average
+
+  Returns
+  -------
+  pd.DataFrame
+      Table with one row for each combination of labels in `groups`. NaN
+      entries are skipped, if all entries of a group are NaN the result is NaN
+      as well.
+  """
+
+  group_id, keys = grouping(index, groups)
+
+  values = np.asarray(df.values)
+  missing = np.isnan(values) if values.dtype.kind in 'fc' else \
+                                          np.zeros(values.shape, dtype=bool)
+
+  # rows sorted by group to sum every group in one contiguous block
+  order = np.argsort(group_id, kind='mergesort')
+  starts = np.flatnonzero(np.r_[True, np.diff(group_id[order]) != 0])
+
+  result = np.add.reduceat(np.where(missing, 0, values)[order], starts, axis=0)
+  counts = np.add.reduceat((~missing)[order].astype(int), starts, axis=0)
+
+  with np.errstate(divide='ignore', invalid='ignore'):
+    if how == 'mean':
+      result = result / counts
+    result = np.where(counts > 0, result, np.nan)
+
+  return DataFrame(result, index=keys, columns=df.columns)
+
+def split(df, index, groups):
+  """
+  Iterate over the subtables of `df` sharing the labels in the given levels
+
+  Parameters
+  ----------
+  df : pd.DataFrame
+      Table with rows in the order `index` was built for
+  index : dict
+      Precomputed index as returned by build_index()
+  groups : list of string
+      Names of groups in `lookup_groups` or level names
+
+  Yields
+  ------
+  key : tuple
+      The labels of the group
+  pd.DataFrame
+      All rows of the group with the levels in `groups` dropped from the index
+  """
+
+  group_id, keys = grouping(index, groups)
+  levels = _levels(groups)
+
+  order = np.argsort(group_id, kind='mergesort')
+  bounds = np.r_[np.flatnonzero(np.r_[True, np.diff(group_id[order]) != 0]),
+                                                                   len(order)]
+
+  for key, start, stop in zip(keys.values, bounds[:-1], bounds[1:]):
+    subtable = df.iloc[order[start:stop]]
+    remaining = [n for n in index['names'] if n not in levels]
+    if len(remaining) > 0:
+      subtable.index = subtable.index.droplevel(levels)
+    yield key, subtable
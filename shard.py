@@ -0,0 +1,93 @@
+# Runs on contiguous parts of the configurations. Reading, subduction and
+# contraction act on every configuration independently, so their output for
+# the full ensemble is the concatenation of the output of all shards.
+
+import os
+import shutil
+
+import pandas as pd
+
+import infile_handler
+import pipeline
+import utils
+from ensemble import Ensemble
+
+# stages that can be computed on a shard
+lookup_shard_stages = ['raw', 'subduced', 'contracted', 'averaged']
+
+def shard_params(params, index, nb_shards):
+  """
+  Parameters of the run on one shard. See infile_handler.read_parameters()
+  """
+
+  return dict(params, shard=(index, nb_shards),
+        outpath=infile_handler.shard_outpath(params['outpath'],
+                                                           (index, nb_shards)))
+
+def outputs(ensemble, p_cm):
+  """
+  All outputs of the stages that can be computed on a shard in the frame
+  `p_cm`. See Ensemble.artifact()
+  """
+
+  irreps = ensemble.irreps(p_cm)
+  outputs = [('raw', p_cm, d) for d in ensemble.diagrams]
+  outputs += [('subduced', p_cm, d, irrep) for d in ensemble.diagrams \
+                                                             for irrep in irreps]
+  outputs += [(stage, p_cm, c, irrep) for stage in ['contracted', 'averaged'] \
+                                 for c in ensemble.correlators for irrep in irreps]
+  return outputs
+
+def merge(params, nb_shards):
+  """
+  Concatenate the output of `nb_shards` shards along the gauge configurations
+  and write it into the usual stage directories
+
+  Parameters
+  ----------
+  params : dict
+      Parameters of the full ensemble as returned by
+      infile_handler.read_parameters()
+  nb_shards : int
+      Number of shards the ensemble was split into
+
+  Notes
+  -----
+  Outputs missing in any of the shards are skipped. The merged files get the
+  digest of the full ensemble, see Ensemble.is_current()
+  """
+
+  verbose = params['verbose']
+  ensemble = Ensemble(params)
+  shards = [shard_params(params, i, nb_shards) for i in range(nb_shards)]
+
+  for p_cm in params['p_cm']:
+    for output in outputs(ensemble, p_cm):
+      directory, filename = ensemble.artifact(*output)
+      paths = [pipeline.set_path(p, directory)+filename for p in shards]
+
+      missing = [path for path in paths if not os.path.isfile(path)]
+      if len(missing) == len(paths):
+        continue
+      if len(missing) > 0:
+        print 'Warning: skipped %s, missing in %d shards' % (filename,
+                                                                 len(missing))
+        continue
+
+      if verbose:
+        print '\tmerging %s' % filename
+
+      data = [utils.read_hdf5_correlators(path, 'data') for path in paths]
+      if output[0] == 'raw':
+        # raw data has configurations as rows, all later stages as columns
+        data = pd.concat(data, axis=0)
+      else:
+        data = pd.concat(data, axis=1)
+
+      path = pipeline.set_path(params, directory)
+      utils.write_hdf5_correlators(path, filename, data, 'data', verbose)
+      if output[0] == 'raw':
+        # the quantum numbers are the same in every shard
+        qn = filename.replace('.h5', '_qn.h5')
+        shutil.copy(pipeline.set_path(shards[0], directory)+qn, path+qn)
+      ensemble.write_digest(*output)
@@ -0,0 +1,211 @@
+# Tables of all stages kept within a memory budget. The least recently used
+# tables are pickled to a scratch directory and read back when they are asked
+# for again.
+
+import atexit
+import collections
+import cPickle
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+def nbytes(value):
+  """
+  Approximate size of `value` in memory in bytes. Containers are summed over
+  their items
+  """
+
+  if isinstance(value, pd.DataFrame):
+    # memory_usage() goes through the columns one by one, which is slow for
+    # tables with the configurations as columns
+    return len(value.index) * sum(dtype.itemsize for dtype in value.dtypes) \
+                                    + value.index.nbytes + value.columns.nbytes
+  if isinstance(value, pd.Series):
+    return int(value.memory_usage(index=True))
+  if isinstance(value, np.ndarray):
+    return value.nbytes
+  if isinstance(value, (tuple, list)):
+    return sum(nbytes(v) for v in value)
+  if isinstance(value, dict):
+    return sum(nbytes(v) for v in value.values())
+  return sys.getsizeof(value)
+
+class ArtifactStore(object):
+  """
+  Dictionary holding at most `budget` MB in memory
+
+  Parameters
+  ----------
+  budget : int
+      Memory budget in MB. 0 keeps everything in memory
+  scratch : string, optional
+      Directory the spilled tables are written to. Defaults to the directory
+      of the tempfile module. Should be on a local disk
+
+  Notes
+  -----
+  Tables larger than the budget stay in memory until the next one is stored.
+  A table returned by the store is not copied, so it must not be changed in
+  place after it was stored. The spilled tables are deleted at exit
+
+  The budget only holds as long as the tables are used one after the other.
+  Tables kept by the caller stay in memory even if the store spilled them, so
+  items() and to_dict() hold all tables at once. So does everything needing 
+  several tables together: the gevp of one irrep and the automatic block size
+  of Ensemble, which is calculated from the averaged data of all correlators 
+  of a frame
+  """
+
+  def __init__(self, budget=0, scratch=None):
+    self.budget = budget * 1024**2
+    self.scratch = scratch
+    self._memory = collections.OrderedDict()
+    self._spilled = {}
+    self._size = 0
+    self._directory = None
+
+  def __contains__(self, key):
+    return key in self._memory or key in self._spilled
+
+  def __len__(self):
+    return len(self._memory) + len(self._spilled)
+
+  def __iter__(self):
+    return iter(self.keys())
+
+  def keys(self):
+    return self._memory.keys() + self._spilled.keys()
+
+  def items(self):
+    return [(key, self[key]) for key in self.keys()]
+
+  def get(self, key, default=None):
+    return self[key] if key in self else default
+
+  def __getitem__(self, key):
+    if key in self._spilled:
+      path = self._spilled.pop(key)
+      with open(path, 'rb') as f:
+        value = cPickle.load(f)
+      os.remove(path)
+      self[key] = value
+      return value
+
+    # move to the end as most recently used
+    value, size = self._memory.pop(key)
+    self._memory[key] = (value, size)
+    return value
+
+  def __setitem__(self, key, value):
+    if key in self:
+      del self[key]
+    size = nbytes(value)
+    self._memory[key] = (value, size)
+    self._size += size
+    self._spill()
+
+  def __delitem__(self, key):
+    if key in self._spilled:
+      os.remove(self._spilled.pop(key))
+    else:
+      self._size -= self._memory.pop(key)[1]
+
+  def clear(self):
+    for key in self.keys():
+      del self[key]
+
+  @property
+  def size(self):
+    """
+    Bytes held in memory
+    """
+    return self._size
+
+  def _spill(self):
+    """
+    Write the least recently used tables to scratch until the budget is met.
+    The most recently used table is always kept
+    """
+
+    if self.budget <= 0:
+      return
+
+    while self._size > self.budget and len(self._memory) > 1:
+      key, (value, size) = self._memory.popitem(last=False)
+      if self._directory is None:
+        self._directory = tempfile.mkdtemp(prefix='analyse-',
+                                                            dir=self.scratch)
+        atexit.register(shutil.rmtree, self._directory, True)
+      fd, path = tempfile.mkstemp(suffix='.pkl', dir=self._directory)
+      with os.fdopen(fd, 'wb') as f:
+        cPickle.dump(value, f, cPickle.HIGHEST_PROTOCOL)
+      self._spilled[key] = path
+      self._size -= size
+
+  def stage(self, name):
+    """
+    Dictionary-like view on the tables of one stage sharing the budget of the
+    store
+
+    Parameters
+    ----------
+    name : string
+        Prefix of all keys of the view
+    """
+
+    return _StageView(self, name)
+
+class _StageView(object):
+  """
+  Keys of an ArtifactStore starting with one stage. See ArtifactStore.stage()
+  """
+
+  def __init__(self, store, name):
+    self.store = store
+    self.name = name
+
+  def _key(self, key):
+    return (self.name, key)
+
+  def __contains__(self, key):
+    return self._key(key) in self.store
+
+  def __getitem__(self, key):
+    return self.store[self._key(key)]
+
+  def __setitem__(self, key, value):
+    self.store[self._key(key)] = value
+
+  def __delitem__(self, key):
+    del self.store[self._key(key)]
+
+  def keys(self):
+    return [k[1] for k in self.store.keys() if k[0] == self.name]
+
+  def __iter__(self):
+    return iter(self.keys())
+
+  def __len__(self):
+    return len(self.keys())
+
+  def items(self):
+    return [(key, self[key]) for key in self.keys()]
+
+  def get(self, key, default=None):
+    return self[key] if key in self else default
+
+  def clear(self):
+    for key in self.keys():
+      del self[key]
+
+  def to_dict(self):
+    """
+    All tables of the stage in a dictionary. Loads every spilled table and 
+    holds all of them in memory regardless of the budget
+    """
+
+    return dict(self.items())
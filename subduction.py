@@ -11,15 +11,27 @@ import os
 import operator
 import collections
 
-from asteval import Interpreter
-aeval = Interpreter()
-aeval.symtable['I'] = 1j
+# interpreter for the coefficients given as strings. Built on first use, see
+# aeval()
+_interpreter = []
 
 #import clebsch_gordan_2pt as cg_2pt
 #import clebsch_gordan_4pt as cg_4pt
 import utils
 
-from clebsch_gordan import group
+# clebsch_gordan and asteval are imported when the first table is calculated
+
+def aeval(expression):
+  """
+  Evaluate a coefficient given as string like 'sqrt(2)/2*I'
+  """
+
+  if not _interpreter:
+    from asteval import Interpreter
+    interpreter = Interpreter()
+    interpreter.symtable['I'] = 1j
+    _interpreter.append(interpreter)
+  return _interpreter[0](expression)
 
 def select_irrep(df, irrep):
   """
@@ -82,6 +94,9 @@ def select_irrep_mult(df, irrep, mult):
 
   return df
 
+# Clebsch-Gordan tables already calculated. They only depend on p_cm
+_cg_tables = {}
+
 # TODO: path for groups is hardcoded here. Shift that into clebsch-gordan module
 def return_cg(p_cm, irrep):
   """
@@ -112,7 +127,8 @@ def return_cg(p_cm, irrep):
   -----
 
     J, M are both hardcoded to (0,0) referring to scattering of two 
-    (pseudo)scalars
+    (pseudo)scalars. The table does not depend on the irrep and is only 
+    calculated once per p_cm and process. Copies are returned
 
   See
   ---
@@ -120,6 +136,11 @@ def return_cg(p_cm, irrep):
     clebsch_gordan.example_cg
   """
 
+  if p_cm in _cg_tables:
+    return _cg_tables[p_cm].copy()
+
+  from clebsch_gordan import group
+
   prefs = [[0.,0.,0.], [0.,0.,1.], [0.,1.,1.], [1.,1.,1.], [0.,0.,2.]]
 #           [0.,1.,2.], [1.,1.,2.]]
   p2max = len(prefs)
@@ -203,7 +224,8 @@ def return_cg(p_cm, irrep):
   # C2 for the rho
   #df = select_irrep(df, irrep)
 
-  return df
+  _cg_tables[p_cm] = df
+  return df.copy()
 
 def get_lattice_basis(p_cm, verbose=True, j=1):
   """
@@ -227,6 +249,8 @@ def get_lattice_basis(p_cm, verbose=True, j=1):
         indices
   """
 
+  from clebsch_gordan import group
+
   prefs = [[0.,0.,0.], [0.,0.,1.], [0.,1.,1.], [1.,1.,1.]]
 
   # initialize groups
@@ -0,0 +1,82 @@
+# the modules of the analysis are imported from the top level directory
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                         '..'))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import infile_handler
+import pipeline
+import raw_data
+import selection
+
+infile = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                                                                  'A40.24.in')
+
+@pytest.fixture
+def params(tmpdir):
+  """
+  Parameters of the test infile writing into a temporary output path. Only the
+  frame p_cm = 0 is analysed
+  """
+
+  with open(infile) as f:
+    content = f.read()
+  content = content.replace('/hiskp2/werner/pipi_I1/data/', str(tmpdir))
+  content = content.replace('Old data', 'Rho analysis = True\nOld data')
+  path = tmpdir.join('test.in')
+  path.write(content)
+
+  params = infile_handler.read_infile(str(path))
+  params.update(p_cm=[0], missing_configs=[])
+  return params
+
+@pytest.fixture
+def fake_pipeline(monkeypatch):
+  """
+  Replace reading, subduction, contraction, averaging and the gevp by cheap
+  stand-ins that keep the layout of the data: raw data has configurations as
+  rows, all later stages as columns. The data depends on the diagram and the
+  configuration. Returns the list of calls made so far
+  """
+
+  calls = []
+
+  def read(params, diagram, directory, p_cm):
+    lookup_cnfg = raw_data.set_lookup_cnfg(params['sta_cnfg'],
+          params['end_cnfg'], params['del_cnfg'], params['missing_configs'], 0,
+          params['nb_preview'], params['preview_selection'],
+                                                         shard=params['shard'])
+    calls.append(('read', diagram, len(lookup_cnfg)))
+    data = pd.DataFrame(np.outer(lookup_cnfg, np.arange(1, 4)*len(diagram)),
+                             index=list(lookup_cnfg), columns=['o1','o2','o3'])
+    return data, pd.DataFrame([[diagram]])
+
+  def subduce(params, data, lookup_qn, diagram, p_cm, irrep, basis):
+    calls.append(('subduce', diagram, irrep))
+    return data.T * (2 if irrep == 'A1' else 3)
+
+  def contract(params, data, index, correlator, irrep):
+    calls.append(('contract', correlator, irrep))
+    return sum(data[(d, irrep)] for d in params['diagrams'] \
+                                                   if d.startswith(correlator))
+
+  def build_gevp(params, contracted_data_avg, irrep):
+    calls.append(('gevp', irrep))
+    return [([irrep], pd.concat(contracted_data_avg))]
+
+  monkeypatch.setattr(pipeline, 'read', read)
+  monkeypatch.setattr(pipeline, 'get_lattice_basis',
+                                     lambda params, p_cm: (None, ['A1', 'E']))
+  monkeypatch.setattr(pipeline, 'subduce', subduce)
+  monkeypatch.setattr(pipeline, 'contract', contract)
+  monkeypatch.setattr(pipeline, 'average',
+                             lambda contracted, index=None: contracted.iloc[:2])
+  monkeypatch.setattr(pipeline, 'build_gevp', build_gevp)
+  monkeypatch.setattr(pipeline, 'write_gevp', lambda *args: None)
+  monkeypatch.setattr(selection, 'build_index', lambda data: None)
+  return calls
@@ -0,0 +1,35 @@
+import numpy as np
+
+import autocorrelation
+
+def _ar1(rho, nb_cnfg, seed=11):
+  """
+  AR(1) chain x_{i+1} = rho x_i + eta_i with shape (1, cnfg, 1)
+  """
+  eta = np.random.RandomState(seed).normal(size=nb_cnfg)
+  x = np.empty(nb_cnfg)
+  x[0] = eta[0] / np.sqrt(1.-rho**2)
+  for i in range(1, nb_cnfg):
+    x[i] = rho*x[i-1] + eta[i]
+  return x[np.newaxis,:,np.newaxis]
+
+def test_ar1():
+  rho = 0.8
+  data = _ar1(rho, 40000)
+
+  rho_t = autocorrelation.autocorrelation(data)
+  tau, dtau, W = autocorrelation.integrated_time(rho_t)
+
+  # rho(t) = rho^t and tau_int = (1+rho) / (2(1-rho))
+  np.testing.assert_allclose(rho_t[0,:5,0], rho**np.arange(5), atol=0.02)
+  expected = (1.+rho) / (2.*(1.-rho))
+  assert abs(tau[0,0] - expected) < 3*dtau[0,0]
+  assert autocorrelation.block_size(tau) == int(np.ceil(2*tau.max()))
+
+def test_uncorrelated():
+  data = np.random.RandomState(2).normal(size=(2, 5000, 3))
+
+  tau, dtau, W = autocorrelation.integrated_time(
+                                        autocorrelation.autocorrelation(data))
+
+  np.testing.assert_allclose(tau, 0.5, atol=3*dtau.max())
@@ -0,0 +1,38 @@
+import pandas as pd
+
+import blocked
+import pipeline
+import shard
+from ensemble import Ensemble
+
+def test_run(params, fake_pipeline):
+  params = dict(params, cnfg_block=4, streaming=True,
+           checkpoints=dict((stage, True) for stage in params['checkpoints']))
+  contracted_data_avg = blocked.run(params, 0)
+  # 9 configurations in 3 blocks of at most 4
+  assert [c[2] for c in fake_pipeline if c[:2] == ('read', 'C20')] == [3, 3, 3]
+
+  # the blocks appended to the files equal an unblocked run
+  unblocked = Ensemble(dict(params, outpath=params['outpath'] + '/unblocked'))
+  ensemble = Ensemble(params)
+  for output in shard.outputs(ensemble, 0):
+    assert ensemble.is_current(*output)
+    directory, filename = ensemble.artifact(*output)
+    data = getattr(unblocked, output[0])(*output[1:])
+    if output[0] == 'raw':
+      data = data[0]
+    pd.util.testing.assert_frame_equal(
+                     pipeline.load(params, directory, filename), data)
+    if output[0] == 'averaged':
+      pd.util.testing.assert_frame_equal(contracted_data_avg[output[2:]], data)
+
+def test_checkpoints(params, fake_pipeline):
+  params = dict(params, cnfg_block=4, streaming=True,
+                  checkpoints=dict(params['checkpoints'], raw=False,
+                                                              subduced=False))
+  blocked.run(params, 0)
+
+  ensemble = Ensemble(params)
+  for output in shard.outputs(ensemble, 0):
+    assert ensemble.is_current(*output) == (output[0] in ['contracted',
+                                                                  'averaged'])
@@ -0,0 +1,27 @@
+import numpy as np
+
+import covariance
+
+def test_covariance():
+  data = np.random.RandomState(5).normal(size=(3, 40, 6))
+
+  cov, intensity = covariance.covariance(data)
+
+  for row in range(len(data)):
+    np.testing.assert_allclose(cov[row],
+                               np.cov(data[row], rowvar=False) / data.shape[1])
+  assert (intensity == 0).all()
+
+def test_shrinkage():
+  data = np.random.RandomState(5).normal(size=(3, 10, 6))
+
+  cov, intensity = covariance.covariance(data)
+  shrunk, intensity = covariance.covariance(data, shrinkage=True)
+
+  assert ((intensity > 0) & (intensity <= 1)).all()
+  # the diagonal is kept, the off diagonal elements are shrunk
+  np.testing.assert_allclose(np.diagonal(shrunk, axis1=1, axis2=2),
+                             np.diagonal(cov, axis1=1, axis2=2))
+  l = intensity[:,np.newaxis,np.newaxis]
+  off_diagonal = 1. - np.eye(data.shape[2])
+  np.testing.assert_allclose(shrunk*off_diagonal, (1.-l)*cov*off_diagonal)
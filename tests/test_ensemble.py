@@ -0,0 +1,72 @@
+import os
+
+import pipeline
+import scheduler
+from ensemble import Ensemble
+
+def _raw_file(ensemble, diagram='C20'):
+  directory, filename = ensemble.artifact('raw', 0, diagram)
+  return pipeline.set_path(ensemble.params, directory) + filename
+
+def test_memoized_data_is_written_again(params, fake_pipeline):
+  ensemble = Ensemble(params)
+  ensemble.raw(0, 'C20')
+  path = _raw_file(ensemble)
+  assert os.path.isfile(path) and os.path.isfile(path + '.key')
+
+  # removed files are written again without reading the raw data
+  os.remove(path)
+  os.remove(path + '.key')
+  ensemble.raw(0, 'C20')
+  assert os.path.isfile(path) and os.path.isfile(path + '.key')
+  assert len([c for c in fake_pipeline if c[0] == 'read']) == 1
+
+  # so is all data when the output path changes
+  ensemble.update(dict(params, outpath=params['outpath'] + '/other'))
+  ensemble.raw(0, 'C20')
+  assert os.path.isfile(_raw_file(ensemble))
+
+def test_view(params, fake_pipeline):
+  ensemble = Ensemble(params)
+  ensemble.view(write=False).raw(0, 'C20')
+  assert not os.path.isfile(_raw_file(ensemble))
+  assert not ensemble.view(recompute=['raw']).is_current('raw', 0, 'C20')
+
+  # the view shares the memoized data
+  ensemble.raw(0, 'C20')
+  assert os.path.isfile(_raw_file(ensemble))
+  assert len([c for c in fake_pipeline if c[0] == 'read']) == 1
+
+def test_is_current(params, fake_pipeline):
+  Ensemble(params).raw(0, 'C20')
+  assert Ensemble(params).is_current('raw', 0, 'C20')
+  # the configurations enter the digest
+  changed = dict(params, end_cnfg=params['end_cnfg'] - params['del_cnfg'])
+  assert not Ensemble(changed).is_current('raw', 0, 'C20')
+  assert not Ensemble(params, reuse=False).is_current('raw', 0, 'C20')
+
+  # so do the digests of upstream stages
+  Ensemble(params).subduced(0, 'C20', 'A1')
+  assert Ensemble(params).is_current('subduced', 0, 'C20', 'A1')
+  Ensemble(changed).raw(0, 'C20')
+  assert not Ensemble(changed).is_current('subduced', 0, 'C20', 'A1')
+
+  # files without digest are recomputed by the cache only
+  os.remove(_raw_file(Ensemble(params)) + '.key')
+  assert Ensemble(params).is_current('raw', 0, 'C20')
+  params = dict(params, cache=True, flag_read=True)
+  assert not Ensemble(params).is_current('raw', 0, 'C20')
+
+def test_run_task(params, fake_pipeline, capsys):
+  params = dict(params, cache=True, verbose=False)
+  ensemble = Ensemble(params)
+  scheduler.run_task(params, ('read', 0, 'C20'), ensemble)
+  scheduler.run_task(params, ('read', 0, 'C20'), ensemble)
+  assert capsys.readouterr()[0] == ''
+  assert len([c for c in fake_pipeline if c[0] == 'read']) == 1
+
+  os.remove(_raw_file(ensemble))
+  params['verbose'] = True
+  scheduler.run_task(params, ('read', 0, 'C20'), ensemble.view())
+  assert 'running read 0 C20' in capsys.readouterr()[0]
+  assert os.path.isfile(_raw_file(ensemble))
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+import fit
+
+def _table(c, nb_cnfg=50, seed=3, T=None):
+  """
+  Table with one row of `c` times small multiplicative noise on every
+  configuration. `T` are the timeslices of `c`
+  """
+  noise = 1. + 1e-3*np.random.RandomState(seed).normal(size=(nb_cnfg, 1))
+  if T is None:
+    T = range(len(c))
+  columns = pd.MultiIndex.from_product([range(nb_cnfg), T],
+                                                       names=['cnfg', 'T'])
+  return DataFrame((c*noise).reshape((1, -1)), index=['C2'], columns=columns)
+
+def test_single_state():
+  T, A, E = 32, 1.5, 0.4
+  t = np.arange(T)
+  c = A * (np.exp(-E*t) + np.exp(-E*(T-t)))
+  fit_ranges = fit.set_lookup_fit_ranges(4, 14, 5)
+
+  result = fit.fit(_table(c), T, 'cosh', fit_ranges, nb_samples=10)
+
+  np.testing.assert_allclose(result['mean', 'E0'], E, rtol=1e-6)
+  np.testing.assert_allclose(result['mean', 'A0'], A, rtol=1e-3)
+  assert (result['mean', 'chi2/dof'] < 1e-6).all()
+
+def test_underdetermined_range():
+  T = 32
+  c = np.cosh(0.4*(np.arange(T)-T/2.))
+  try:
+    fit.fit(_table(c), T, 'cosh', [(4, 5)])
+  except ValueError:
+    pass
+  else:
+    assert False, 'fit range with two timeslices accepted for two parameters'
+
+def test_dropped_timeslices():
+  T, A, E = 32, 1.5, 0.4
+  t = np.arange(T)
+  # the excited state makes the result depend on the fit range
+  c = A * (np.exp(-E*t) + np.exp(-E*(T-t))) + np.exp(-1.2*t)
+  fit_ranges = [(4, 10), (6, 14)]
+
+  full = fit.fit(_table(c), T, 'cosh', fit_ranges, nb_samples=10)
+  # the leading timeslices are missing as after dropna
+  dropped = fit.fit(_table(c[3:], T=t[3:]), T, 'cosh', fit_ranges,
+                                                                nb_samples=10)
+
+  np.testing.assert_allclose(dropped['mean'].values, full['mean'].values,
+                                                                   atol=1e-8)
+  try:
+    fit.fit(_table(c[3:], T=t[3:]), T, 'cosh', [(2, 10)])
+  except ValueError:
+    pass
+  else:
+    assert False, 'fit range outside the data accepted'
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+import gevp
+
+# amplitudes Z_{in} of operator i and state n and the energies of the states
+Z = np.array([[2., 1.], [1., 2.]])
+E = np.array([0.3, 0.7])
+t0s = [1, 2]
+
+def _correlator(T=12):
+  """
+  Two state correlator matrix C_ij(t) = \sum_n Z_in Z_jn e^{-E_n t} with a
+  single sample
+  """
+  t = np.arange(T)
+  return np.einsum('in,jn,tn->tij', Z, Z, np.exp(-E*t[:,None]))[np.newaxis]
+
+def test_energies():
+  eigenvalues = gevp.solve(_correlator(), t0s)[0]
+  energies = gevp.effective_energies(eigenvalues)
+
+  # before t0 the eigenvalues are sorted the other way round
+  for i, t0 in enumerate(t0s):
+    np.testing.assert_allclose(energies[0,i,t0:-1],
+                               np.broadcast_to(E, energies[0,i,t0:-1].shape))
+  assert np.isnan(energies[...,-1,:]).all()
+
+def test_overlaps():
+  eigenvalues, eigenvectors, L = gevp.solve(_correlator(), t0s)
+  energies = gevp.effective_energies(eigenvalues)
+  overlaps = gevp.overlaps(eigenvectors, L, energies, t0s)
+
+  # 0.8 of operator 0 is state 0. At t0 the eigenvectors are degenerate
+  expected = Z**2 / np.sum(Z**2, axis=-1, keepdims=True)
+  for i, t0 in enumerate(t0s):
+    o = overlaps[0,i,t0+1:-1]
+    np.testing.assert_allclose(o, np.broadcast_to(expected, o.shape))
+
+def test_indefinite_sample():
+  C = _correlator()
+  C = np.concatenate([C, -C, C])
+  eigenvalues, eigenvectors, L = gevp.solve(C, t0s)
+
+  assert np.isnan(eigenvalues[1]).all()
+  assert np.isnan(eigenvectors[1]).all()
+  assert np.isfinite(eigenvalues[[0,2]]).all()
+
+def test_t0_outside_data():
+  C = _correlator()
+  # a table without timeslice 1 as left by dropna
+  T = [0] + range(2, C.shape[1])
+  index = pd.MultiIndex.from_product([[0, 1], [0, 1]],
+                                                  names=['gevp_row', 'gevp_col'])
+  columns = pd.MultiIndex.from_product([range(3), T], names=['cnfg', 'T'])
+  data = np.tile(C[0][T].transpose((1,2,0)).reshape((4, 1, -1)), (1, 3, 1))
+  gevp_data = DataFrame(data.reshape((4, -1)), index=index, columns=columns)
+
+  for t0s in [[1], [2, 20]]:
+    try:
+      gevp.gevp(gevp_data, t0s, nb_samples=3)
+    except ValueError:
+      pass
+    else:
+      assert False, 't0 = %s accepted' % t0s
+  gevp.gevp(gevp_data, [2], nb_samples=3)
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+import raw_data
+
+# source and sink Dirac structures and the expected sign under time reversal
+lookup_ops = [(5, 5, 1), (1, 1, 1), (10, 10, 1), (1, 10, -1), (13, 13, 1),
+              (1, 13, 1), (10, 13, -1)]
+
+def _lookup_qn():
+  return DataFrame([[so, si] for so, si, _ in lookup_ops],
+                                     columns=['\gamma_{so}', '\gamma_{si}'])
+
+def test_parity():
+  lookup_qn = _lookup_qn()
+  assert list(raw_data.parity(lookup_qn, 'C20')) == \
+                                                [p for _, _, p in lookup_ops]
+
+def test_fold_data():
+  T, E = 24, 0.3
+  lookup_qn = _lookup_qn()
+  signs = np.array([p for _, _, p in lookup_ops])
+  t = np.arange(T)
+  # even operators are symmetric around T/2, odd ones antisymmetric
+  lookup_corr = {1 : np.cosh(E*(t-T/2.)), -1 : np.sinh(E*(t-T/2.))}
+  correct = np.array([lookup_corr[p] for p in signs]).T
+  wrong = np.array([lookup_corr[-p] for p in signs]).T
+
+  # an admixture of the wrong parity differing between the configurations
+  # is removed by folding
+  cnfgs = [1, 5]
+  values = np.concatenate([correct + c*wrong for c in [0.5, -2.]])
+  index = pd.MultiIndex.from_product([cnfgs, range(T)], names=['cnfg', 'T'])
+  data = DataFrame(values, index=index)
+
+  folded = raw_data.fold_data(data, lookup_qn, 'C20', T)
+
+  assert folded.shape == (len(cnfgs)*(T//2+1), len(lookup_ops))
+  # t = 0 is its own partner and odd correlators are not periodic there
+  for cnfg in cnfgs:
+    np.testing.assert_allclose(folded.loc[cnfg].values[1:],
+                                                         correct[1:T//2+1])
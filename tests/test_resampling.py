@@ -0,0 +1,33 @@
+import numpy as np
+
+import resampling
+
+def test_jackknife():
+  data = np.random.RandomState(4).normal(size=(100, 3))
+
+  samples = resampling.resample(data, 'jackknife', 0)
+  error = resampling.error(samples, 'jackknife')
+
+  assert samples.shape == (101, 3)
+  np.testing.assert_allclose(samples[0], data.mean(axis=0))
+  # the jackknife error of the mean is exactly the standard error
+  np.testing.assert_allclose(error, data.std(axis=0, ddof=1) / np.sqrt(100))
+
+def test_blocked_jackknife():
+  data = np.random.RandomState(4).normal(size=(100, 3))
+
+  samples = resampling.resample(data, 'jackknife', 0, block_size=4)
+  blocks = data.reshape((25, 4, 3)).mean(axis=1)
+
+  np.testing.assert_allclose(resampling.error(samples, 'jackknife'),
+                             blocks.std(axis=0, ddof=1) / np.sqrt(25))
+
+def test_bootstrap():
+  data = np.random.RandomState(4).normal(size=(100, 3))
+
+  samples = resampling.resample(data, 'bootstrap', 2000)
+  error = resampling.error(samples, 'bootstrap')
+
+  np.testing.assert_allclose(samples[0], data.mean(axis=0))
+  np.testing.assert_allclose(error, data.std(axis=0) / np.sqrt(100),
+                                                                    rtol=0.1)
@@ -0,0 +1,35 @@
+import pandas as pd
+
+import pipeline
+import shard
+from ensemble import Ensemble
+
+def _run(ensemble):
+  for output in shard.outputs(ensemble, 0):
+    getattr(ensemble, output[0])(*output[1:])
+
+def _load(params, output):
+  directory, filename = Ensemble(params).artifact(*output)
+  return pipeline.load(params, directory, filename)
+
+def test_merge(params, fake_pipeline):
+  nb_shards = 3
+  for index in range(nb_shards):
+    _run(Ensemble(shard.shard_params(params, index, nb_shards)))
+  shard.merge(params, nb_shards)
+  reads = [c[2] for c in fake_pipeline if c[:2] == ('read', 'C20')]
+
+  # the merged data is current and equals the data of an unsharded run
+  ensemble = Ensemble(params)
+  outputs = shard.outputs(ensemble, 0)
+  assert all(ensemble.is_current(*output) for output in outputs)
+  merged = dict((output, _load(params, output)) for output in outputs)
+
+  unsharded = dict(params, outpath=params['outpath'] + '/unsharded')
+  _run(Ensemble(unsharded))
+  # every shard read its own part of the configurations
+  nb_cnfg = [c[2] for c in fake_pipeline if c[:2] == ('read', 'C20')][-1]
+  assert len(reads) == nb_shards and sum(reads) == nb_cnfg
+  for output in outputs:
+    pd.util.testing.assert_frame_equal(merged[output],
+                                                   _load(unsharded, output))
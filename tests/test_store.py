@@ -0,0 +1,63 @@
+import os
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+import autocorrelation
+import covariance
+import pipeline
+from store import ArtifactStore, nbytes
+
+def _averaged(seed, nb_cnfg=9000, T=2):
+  """
+  Table like the averaged data with 3 rows and columns for configuration and
+  timeslice
+  """
+
+  columns = pd.MultiIndex.from_product([range(nb_cnfg), range(T)],
+                                                          names=['cnfg', 'T'])
+  return DataFrame(np.random.RandomState(seed).normal(size=(3, nb_cnfg*T)),
+                                     index=['a', 'b', 'c'], columns=columns)
+
+def test_spill(tmpdir):
+  store = ArtifactStore(1, str(tmpdir))
+  tables = dict((n, DataFrame(np.random.RandomState(n).normal(size=(400,100))))
+                                                              for n in range(8))
+  for n, table in tables.items():
+    store[n] = table
+
+  # the least recently used tables were written to scratch
+  spilled = [f for _, _, files in os.walk(str(tmpdir)) for f in files]
+  assert len(spilled) > 0 and len(store) == len(tables)
+  assert store.size <= store.budget
+
+  for n in sorted(tables, reverse=True):
+    pd.util.testing.assert_frame_equal(store[n], tables[n])
+    assert store.size <= store.budget
+
+  store.clear()
+  assert [f for _, _, files in os.walk(str(tmpdir)) for f in files] == []
+
+def test_stage_per_key(tmpdir):
+  store = ArtifactStore(1, str(tmpdir))
+  averaged = store.stage('averaged')
+  tables = {}
+  for n, key in enumerate([('C2', 'A1'), ('C2', 'E'), ('C4', 'A1')]):
+    tables[key] = _averaged(n)
+    averaged[key] = tables[key]
+  assert store.size <= store.budget < sum(map(nbytes, tables.values()))
+
+  # reading the stage table by table equals treating all tables at once
+  tau_data = pipeline.autocorrelation_times(averaged)
+  expected = autocorrelation.analyse(pd.concat(tables,
+                                                names=['correlator', 'irrep']))
+  pd.util.testing.assert_frame_equal(tau_data, expected)
+
+  covariance.write_covariance(str(tmpdir), 'per_key.npz', averaged)
+  covariance.write_covariance(str(tmpdir), 'concat.npz',
+                              pd.concat(tables, names=['correlator', 'irrep']))
+  per_key = np.load(str(tmpdir.join('per_key.npz')))
+  concat = np.load(str(tmpdir.join('concat.npz')))
+  for name in ['cov', 'intensity', 'T', 'index', 'index_names']:
+    np.testing.assert_array_equal(per_key[name], concat[name])
@@ -7,11 +7,9 @@ import os
 import numpy as np
 import pandas as pd
 from pandas import Series, DataFrame
-import gmpy
 
-import matplotlib
-matplotlib.use('Agg') 
-from matplotlib.backends.backend_pdf import PdfPages
+# gmpy and matplotlib are only imported by the functions needing them to keep
+# them out of the start up of runs that do not write a gevp or plot
 
 ################################################################################
 # checks if the directory where the file will be written does exist
@@ -37,7 +35,14 @@ def read_hdf5_correlators(path, key):
       The data contained in the hdf5 file under the given key
   """
 
-  data = pd.read_hdf(path, key)
+  with pd.HDFStore(path, 'r') as store:
+    blocks = [k for k in store.keys() if k.startswith('/%s/block' % key)]
+    if len(blocks) == 0:
+      return store[key]
+    # written block by block by append_hdf5_correlators()
+    blocks.sort(key=lambda k: int(k.rsplit('block', 1)[1]))
+    axis = store.get_storer(blocks[0]).attrs.axis
+    data = pd.concat([store[k] for k in blocks], axis=axis)
   
   return data
   
@@ -64,9 +69,44 @@ def write_hdf5_correlators(path, filename, data, key, verbose=False):
   if verbose:
     print '\tfinished writing', filename
 
+def append_hdf5_correlators(path, filename, data, key, block, axis, 
+                                                                verbose=False):
+  """
+  write pd.DataFrame as one block of the gauge configurations into a hdf5 file
+
+  Parameters
+  ----------
+  path : string
+      Path to store the hdf5 file
+  filename : string
+      Name to save the hdf5 file as
+  data : pd.DataFrame
+      The data of one block of configurations
+  key : string
+      The hdf5 groupname to access all blocks under
+  block : int
+      Index of the block. Block 0 replaces an existing file, all others are 
+      appended
+  axis : int
+      Axis of the gauge configurations in `data`
+
+  Notes
+  -----
+  Every block is a dataset of its own. read_hdf5_correlators() concatenates
+  them along `axis`
+  """
+
+  ensure_dir(path)
+  with pd.HDFStore(path+filename, 'w' if block == 0 else 'a') as store:
+    store.put('%s/block%d' % (key, block), data)
+    store.get_storer('%s/block%d' % (key, block)).attrs.axis = axis
+
+  if verbose:
+    print '\tfinished appending block %d to %s' % (block, filename)
+
 ################################################################################
 # TODO: write that for a pandas dataframe with hierarchical index nb_cnfg x T
-def write_data_ascii(data, filename, verbose=False):
+def write_data_ascii(data, filename, verbose=False, T=None, folded=False):
   """
   Writes the data into a file.
   
@@ -76,6 +116,12 @@ def write_data_ascii(data, filename, verbose=False):
       The filename of the file.
   data: np.array
       A 2d numpy array with data. shape = (nsamples, T)
+  T : int, optional
+      Time extent of the lattice. Defaults to the number of timeslices in 
+      `data`
+  folded : bool, optional
+      Whether `data` was folded under time reversal and only contains the 
+      timeslices 0, ..., T/2
 
   Notes
   -----
@@ -83,6 +129,8 @@ def write_data_ascii(data, filename, verbose=False):
 
   The file is written to have L. Liu's data format so that the first line
   has information about the number of samples and the length of each sample.
+  The third entry of the header is 1 for folded data and 0 otherwise. The
+  second entry always is the time extent of the lattice.
   """
   if verbose:
     print("saving to file " + str(filename))
@@ -93,14 +141,16 @@ def write_data_ascii(data, filename, verbose=False):
     data = data.reshape(1, -1)
   # init variables
   nsamples = data.shape[0]
-  T = data.shape[1]
+  nb_T = data.shape[1]
+  if T is None:
+    T = nb_T
   L = int(T/2)
   # write header
-  head = "%i %i %i %i %i" % (nsamples, T, 0, L, 0)
+  head = "%i %i %i %i %i" % (nsamples, T, 1 if folded else 0, L, 0)
   # prepare data and counter
   #_data = data.flatten()
-  _data = data.reshape((T*nsamples), -1)
-  _counter = np.fromfunction(lambda i, *j: i%T,
+  _data = data.reshape((nb_T*nsamples), -1)
+  _counter = np.fromfunction(lambda i, *j: i%nb_T,
                              (_data.shape[0],) + (1,)*(len(_data.shape)-1), dtype=int)
   _fdata = np.concatenate((_counter,_data), axis=1)
   # generate format string
@@ -126,7 +176,31 @@ def pd_series_to_np_array(series):
 
   return np.asarray(series.values).reshape(series.unstack().shape)
 
-def write_ascii_correlators(path, filename, data, verbose):
+def pd_dataframe_to_np_array(df):
+  """
+  Converts a pandas DataFrame with hierarchical columns to a 3d numpy array
+
+  Parameters
+  ----------
+  df : pd.DataFrame
+      Table with arbitrary rows and hierarchical columns where level 0 is the
+      gauge configuration/sample number and level 1 is the lattice time
+
+  Returns
+  -------
+  np.array
+      Array of shape (rows, cnfg, T). The order of rows is the one of `df`,
+      configurations and timeslices are sorted
+  """
+
+  df = df.sort_index(axis=1)
+  nb_cnfg = len(df.columns.get_level_values(0).unique())
+  nb_T = len(df.columns.get_level_values(1).unique())
+
+  return np.asarray(df.values).reshape((len(df.index), nb_cnfg, nb_T))
+
+def write_ascii_correlators(path, filename, data, verbose, T=None, 
+                                                                folded=False):
   """
   write pd.DataFrame as ascii file in Liuming's format
 
@@ -138,13 +212,20 @@ def write_ascii_correlators(path, filename, data, verbose):
       Name to save the hdf5 file as
   data : pd.DataFrame
       The data to write
+  T : int, optional
+      Time extent of the lattice
+  folded : bool, optional
+      Whether `data` was folded under time reversal. See write_data_ascii()
   """
 
   ensure_dir(path)
   fname = os.path.join(path, filename)
-  write_data_ascii(np.asarray(pd_series_to_np_array(data)), fname, verbose)
+  write_data_ascii(np.asarray(pd_series_to_np_array(data)), fname, verbose, T,
+                                                                      folded)
 
-def write_ascii_gevp(path, data, p_cm, irrep, verbose):
+def write_ascii_gevp(path, data, p_cm, irrep, verbose, T=None, folded=False):
+
+  import gmpy
 
   assert np.all(data.notnull()), 'Gevp contains null entires'
   assert gmpy.is_square(len(data.index)), 'Gevp is not a square matrix'
@@ -163,13 +244,18 @@ def write_ascii_gevp(path, data, p_cm, irrep, verbose):
 
     # TODO: with to_csv this becomes a onliner but Liumings head format will 
     # be annoying. Also the loop can probably run over data.iterrows()
-    write_ascii_correlators(path, filename, data.ix[counter], verbose)
+    write_ascii_correlators(path, filename, data.ix[counter], verbose, T, 
+                                                                        folded)
 
 def create_pdfplot(path, filename):
   """
   Helper function to create a pdfplot object and ensure existence of the path
   """
 
+  import matplotlib
+  matplotlib.use('Agg') 
+  from matplotlib.backends.backend_pdf import PdfPages
+
   ensure_dir(path)
   pdfplot = PdfPages(path+filename)
 
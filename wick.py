@@ -1,10 +1,47 @@
 import itertools as it
+import numpy as np
 import pandas as pd
 from pandas import Series, DataFrame
 
+import selection
 import utils
 
-def rho_2pt(data, irrep, verbose=0):
+def _multiply_gamma(wick, factors, index=None):
+  """
+  Multiply rows of `wick` with a factor depending on the gamma structures
+
+  Parameters
+  ----------
+  wick : pd.DataFrame
+      Subduced data with levels '\gamma_{so}' and '\gamma_{si}' in the index
+  factors : list of tuple
+      Each entry contains a list of source gamma structures, a list of sink
+      gamma structures and the factor for these rows. None selects all
+      gamma structures
+  index : dict, optional
+      Precomputed selection index of `wick`. Built if not given
+
+  Returns
+  -------
+  pd.DataFrame
+      `wick` with the rows multiplied
+  """
+
+  if index is None:
+    index = selection.build_index(wick)
+
+  f = np.ones(len(wick.index), dtype=complex)
+  for gamma_so, gamma_si, factor in factors:
+    select = {}
+    if gamma_so is not None:
+      select['\gamma_{so}'] = gamma_so
+    if gamma_si is not None:
+      select['\gamma_{si}'] = gamma_si
+    f[selection.positions(index, select)] *= factor
+
+  return wick.multiply(f, axis=0)
+
+def rho_2pt(data, irrep, verbose=0, index=None):
   """
   Perform Wick contraction for 2pt function
 
@@ -46,19 +83,19 @@ def rho_2pt(data, irrep, verbose=0):
   gamma_50i = [(g,) for g in gamma_50i[:-1]]
 
 
-  wick = data[('C20',irrep)]
-
-  idx = pd.IndexSlice
+  if index is not None:
+    index = index.get(('C20',irrep))
 
-  wick.loc[idx[:,:,:,:,gamma_i,  :,gamma_i],  :] *= ( 2.)
-  wick.loc[idx[:,:,:,:,gamma_i,  :,gamma_0i], :] *= (-2.)
-  wick.loc[idx[:,:,:,:,gamma_i,  :,gamma_50i],:] *= ( 2.*1j)
-  wick.loc[idx[:,:,:,:,gamma_0i, :,gamma_i],  :] *= ( 2.)
-  wick.loc[idx[:,:,:,:,gamma_0i, :,gamma_0i], :] *= (-2.)
-  wick.loc[idx[:,:,:,:,gamma_0i, :,gamma_50i],:] *= ( 2.*1j)
-  wick.loc[idx[:,:,:,:,gamma_50i,:,gamma_i],  :] *= ( 2.*1j)
-  wick.loc[idx[:,:,:,:,gamma_50i,:,gamma_0i], :] *= (-2.*1j)
-  wick.loc[idx[:,:,:,:,gamma_50i,:,gamma_50i],:] *= ( 2.)
+  wick = _multiply_gamma(data[('C20',irrep)], [
+                  (gamma_i,   gamma_i,   ( 2.)),
+                  (gamma_i,   gamma_0i,  (-2.)),
+                  (gamma_i,   gamma_50i, ( 2.*1j)),
+                  (gamma_0i,  gamma_i,   ( 2.)),
+                  (gamma_0i,  gamma_0i,  (-2.)),
+                  (gamma_0i,  gamma_50i, ( 2.*1j)),
+                  (gamma_50i, gamma_i,   ( 2.*1j)),
+                  (gamma_50i, gamma_0i,  (-2.*1j)),
+                  (gamma_50i, gamma_50i, ( 2.))], index)
 
   return wick
 
@@ -94,7 +131,7 @@ def pipi_2pt(data, irrep, verbose=0):
 
 ################################################################################
 
-def rho_3pt(data, irrep, verbose=0):
+def rho_3pt(data, irrep, verbose=0, index=None):
   """
   Perform Wick contraction for 3pt function
 
@@ -136,14 +173,14 @@ def rho_3pt(data, irrep, verbose=0):
   gamma_0i = [(g,) for g in gamma_0i[:-1]]
   gamma_50i = [(g,) for g in gamma_50i[:-1]]
 
-  idx = pd.IndexSlice
-
-  wick = data[('C3+',irrep)]
+  if index is not None:
+    index = index.get(('C3+',irrep))
 
   # Warning: 1j hardcoded
-  wick.loc[idx[:,:,:,:,:,:,gamma_i],  :] *= ( 2.)   *(-1j)
-  wick.loc[idx[:,:,:,:,:,:,gamma_0i], :] *= (-2.)   *(-1j) 
-  wick.loc[idx[:,:,:,:,:,:,gamma_50i],:] *= ( 2.*1j)*(-1j)
+  wick = _multiply_gamma(data[('C3+',irrep)], [
+                  (None, gamma_i,   ( 2.)   *(-1j)),
+                  (None, gamma_0i,  (-2.)   *(-1j)),
+                  (None, gamma_50i, ( 2.*1j)*(-1j))], index)
 
   return wick
 
@@ -266,7 +303,7 @@ def set_lookup_correlators(diagrams):
   return lookup_correlators
 
 # TODO: pass path as alternative to read the data
-def rho(data, correlator, irrep, verbose=0):
+def rho(data, correlator, irrep, verbose=0, index=None):
   """
   Sums all diagrams with the factors they appear in the Wick contractions
 
@@ -280,7 +317,9 @@ def rho(data, correlator, irrep, verbose=0):
   irrep : string, {'T1', 'A1', 'E2', 'B1', 'B2'}
       name of the irreducible representation of the little group the operator
       is required to transform under.
-
+  index : Dictionary of dict, optional
+      Selection indices as returned by selection.build_index() for the tables
+      in `data` with the same keys. Built on the fly if not given
 
   Returns
   -------
@@ -299,11 +338,15 @@ def rho(data, correlator, irrep, verbose=0):
   contributing, while the last one has two.
   """
 
+  # the 4pt function is a plain sum of the diagrams and needs no index
+  if correlator == 'C4':
+    return rho_4pt(data, irrep, verbose)
+
   # TODO: I don't think you have to emulate c function pointers for this
-  rho = {'C2' : rho_2pt, 'C3' : rho_3pt, 'C4' : rho_4pt}
+  rho = {'C2' : rho_2pt, 'C3' : rho_3pt}
 
-  # call rho_2pt, rho_3pt, rho_4pt from this loop
-  contracted = rho[correlator](data, irrep, verbose)
+  # call rho_2pt, rho_3pt from this loop
+  contracted = rho[correlator](data, irrep, verbose, index)
 
   return contracted
 
@@ -322,7 +365,6 @@ def pipi(data, correlator, irrep, verbose=0):
       name of the irreducible representation of the little group the operator
       is required to transform under.
 
-
   Returns
   -------
   contracted : pd.DataFrame
@@ -343,7 +385,7 @@ def pipi(data, correlator, irrep, verbose=0):
   # TODO: I don't think you have to emulate c function pointers for this
   pipi = {'C2' : pipi_2pt, 'C4' : pipi_4pt}
 
-  # call rho_2pt, rho_3pt, rho_4pt from this loop
+  # call pipi_2pt, pipi_4pt from this loop
   contracted = pipi[correlator](data, irrep, verbose)
 
   return contracted